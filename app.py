@@ -1,9 +1,61 @@
 import streamlit as st
 import pandas as pd
 from config import settings
-from src.db import init_db, seed_demo_data, list_patients, list_appointments
-from src.kb import init_kb
-from src.orchestrator import build_graph, run_graph
+from src.db import init_db, seed_demo_data, page_patients, page_appointments, find_doctors, write_generation, DEFAULT_PAGE_SIZE
+from src.db import list_appointment_conflicts
+from src.kb import init_kb, kb_stats, load_manifest
+from src.tracing import node_percentiles, db_percentiles
+
+# Streamlit reruns this script on every widget interaction; everything expensive is
+# built once per process (cache_resource) or cached until the next write (cache_data).
+
+@st.cache_resource(show_spinner=False)
+def get_graph(provider: str, classifier: str):
+    from src.orchestrator import build_graph  # langgraph + provider SDKs load on first message, not page load
+    return build_graph(provider, classifier=classifier)
+
+@st.cache_resource(show_spinner=False)
+def ensure_db(db_path: str):
+    init_db(db_path)
+    return True
+
+@st.cache_data(ttl=settings.DASHBOARD_CACHE_TTL_SECONDS, show_spinner=False)
+def cached_patient_page(db_path: str, name_prefix: str, after: tuple, limit: int, generation: int):
+    return page_patients(db_path, name_prefix=name_prefix or None, after=list(after) if after else None, limit=limit, readonly=True)
+
+@st.cache_data(ttl=settings.DASHBOARD_CACHE_TTL_SECONDS, show_spinner=False)
+def cached_appointment_page(db_path: str, filters: tuple, after: tuple, limit: int, generation: int):
+    return page_appointments(db_path, **dict(filters), after=list(after) if after else None, limit=limit, readonly=True)
+
+@st.cache_data(ttl=settings.DASHBOARD_CACHE_TTL_SECONDS, show_spinner=False)
+def cached_doctors(db_path: str, generation: int):
+    return find_doctors(db_path)
+
+@st.cache_data(ttl=settings.DASHBOARD_CACHE_TTL_SECONDS, show_spinner=False)
+def cached_conflicts(db_path: str, generation: int):
+    return list_appointment_conflicts(db_path, readonly=True)
+
+def paged_rows(key: str, fetch, filters: tuple):
+    # keyset pages accumulate in session state; new filters or a DB write start over at page one
+    generation = write_generation(settings.DB_PATH)
+    state = st.session_state.get(key)
+    if not state or state["filters"] != filters or state["generation"] != generation:
+        page = fetch(filters, None, generation)
+        state = st.session_state[key] = {"filters": filters, "generation": generation, "rows": page["rows"], "cursor": page["next_cursor"]}
+    return state
+
+def load_more(key: str, fetch):
+    state = st.session_state[key]
+    if state["cursor"]:
+        page = fetch(state["filters"], tuple(state["cursor"]), state["generation"])
+        state["rows"] = state["rows"] + page["rows"]
+        state["cursor"] = page["next_cursor"]
+
+def _fetch_patients(filters, after, generation):
+    return cached_patient_page(settings.DB_PATH, filters[0], after, DEFAULT_PAGE_SIZE, generation)
+
+def _fetch_appointments(filters, after, generation):
+    return cached_appointment_page(settings.DB_PATH, filters, after, DEFAULT_PAGE_SIZE, generation)
 
 st.set_page_config(page_title="Agentic Healthcare Assistant", layout="wide")
 st.title("Agentic Healthcare Assistant — Medical Task Automation (Enterprise)")
@@ -14,19 +66,27 @@ st.sidebar.caption("Groq needs GROQ_API_KEY. Ollama needs local model.")
 st.sidebar.divider()
 st.sidebar.code(f"DB: {settings.DB_PATH}\nKB: {settings.FAISS_DIR}\nSources: {settings.PDF_SOURCES_DIR}")
 
-init_db(settings.DB_PATH)
+ensure_db(settings.DB_PATH)
 
 with st.sidebar.expander("Demo data"):
     if st.button("Seed demo patients + appointments"):
-        seed_demo_data(settings.DB_PATH, settings.PDF_SOURCES_DIR, settings.RECORDS_XLSX)
+        seed_demo_data(settings.DB_PATH, settings.PDF_SOURCES_DIR, settings.RECORDS_XLSX, workers=settings.KB_INGEST_WORKERS)
         st.success("Seeded demo data.")
+    full_rebuild = st.checkbox("Full rebuild (re-embed every PDF)", value=False)
     if st.button("Build / Refresh Knowledge Base (RAG)"):
-        init_kb(settings.PDF_SOURCES_DIR, settings.FAISS_DIR, settings.EMBEDDING_MODEL)
-        st.success("Knowledge base built.")
-
-graph = build_graph(provider)
+        bar = st.progress(0.0, text="Indexing PDFs...")
+        def _kb_progress(p):
+            total = max(p.get("files_total", 0), 1)
+            bar.progress(min(p.get("files_done", 0) / total, 1.0),
+                         text=f"{p.get('files_done', 0)}/{total} PDFs, {p.get('chunks_embedded', 0)} chunks ({p.get('chunks_per_second', 0)}/s)")
+        init_kb(settings.PDF_SOURCES_DIR, settings.FAISS_DIR, settings.EMBEDDING_MODEL, full_rebuild=full_rebuild,
+                batch_size=settings.KB_EMBED_BATCH_SIZE, workers=settings.KB_INGEST_WORKERS, progress=_kb_progress)
+        bar.empty()
+        build = load_manifest(settings.FAISS_DIR).get("last_build", {})
+        st.success(f"Knowledge base built: {len(build.get('added_files', []))} PDFs embedded, "
+                   f"{len(build.get('removed_files', []))} removed in {build.get('seconds', 0)}s.")
 
-tab1, tab2, tab3 = st.tabs(["Assistant", "Patient & Appointment Dashboard", "Knowledge Base"])
+tab1, tab2, tab3, tab4 = st.tabs(["Assistant", "Patient & Appointment Dashboard", "Knowledge Base", "Performance"])
 
 with tab1:
     st.subheader("Chat with the Healthcare Assistant")
@@ -38,26 +98,89 @@ with tab1:
     )
 
     if st.button("Send", type="primary") and msg.strip():
-        result = run_graph(graph, msg, db_path=settings.DB_PATH, faiss_dir=settings.FAISS_DIR, embedding_model=settings.EMBEDDING_MODEL)
         st.markdown("### Intent / Task Classification")
-        st.json(result.get("intent", {}))
+        intent_box = st.empty()
         st.markdown("### Sentiment")
-        st.json(result.get("sentiment", {}))
-        if result.get("action"):
-            st.markdown("### Action Output")
-            st.json(result["action"])
+        sentiment_box = st.empty()
+        action_box = st.empty()
         st.markdown("### Final Response")
-        st.markdown(result.get("final_response",""))
+        response_box = st.empty()
+        timings_box = st.empty()
+        prompt_box = st.empty()
+        intent_box.caption("Classifying...")
+        sentiment_box.caption("Analyzing...")
+        streamed = ""
+        spans = []
+        from src.orchestrator import stream_graph
+        graph = get_graph(provider, settings.CLASSIFIER_MODE)
+        # panels fill in as their graph nodes finish; the answer streams token by token
+        for event in stream_graph(graph, msg, db_path=settings.DB_PATH, faiss_dir=settings.FAISS_DIR, embedding_model=settings.EMBEDDING_MODEL):
+            if event["type"] == "token":
+                streamed += event["content"]
+                response_box.markdown(streamed + "▌")
+                continue
+            update = event["update"]
+            spans.extend(update.get("trace", []))
+            if "intent" in update:
+                intent_box.json(update["intent"])
+            if "sentiment" in update:
+                sentiment_box.json(update["sentiment"])
+            if update.get("action"):
+                with action_box.container():
+                    st.markdown("### Action Output")
+                    st.json(update["action"])
+            if update.get("retrieval_timings"):
+                timings_box.caption("Retrieval latency (ms): " + ", ".join(f"{k}={v}" for k, v in update["retrieval_timings"].items()))
+            if update.get("context_stats"):
+                cs = update["context_stats"]
+                prompt_box.caption(f"Prompt: {cs['prompt_tokens']}/{cs['budget']} tokens ({cs['tokenizer']}), "
+                                   f"{cs['tokens_saved']} saved, {cs['duplicate_chunks']} duplicate chunks dropped")
+            if "final_response" in update:
+                response_box.markdown(update["final_response"] or streamed)
+        if spans:
+            with st.expander("Node timings for this message"):
+                st.dataframe(pd.DataFrame(spans)[["name", "wall_ms", "prompt_tokens", "completion_tokens", "llm_calls", "retries", "cache_hits", "db_calls", "db_ms", "error"]])
 
 with tab2:
     st.subheader("Patient & Appointment Dashboard")
-    colA, colB = st.columns(2)
+    colA, colB = st.columns([2, 3])
     with colA:
         st.markdown("#### Patients")
-        st.dataframe(list_patients(settings.DB_PATH, limit=100))
+        name_prefix = st.text_input("Name starts with", key="patient_prefix").strip()
+        patients = paged_rows("patients_page", _fetch_patients, (name_prefix,))
+        st.dataframe(pd.DataFrame(patients["rows"]), use_container_width=True)
+        st.caption(f"{len(patients['rows'])} loaded" + ("" if patients["cursor"] else " (all)"))
+        st.button("Load more patients", on_click=load_more, args=("patients_page", _fetch_patients), disabled=not patients["cursor"])
     with colB:
         st.markdown("#### Appointments")
-        st.dataframe(list_appointments(settings.DB_PATH, limit=100))
+        conflicts = cached_conflicts(settings.DB_PATH, write_generation(settings.DB_PATH))
+        if conflicts:
+            st.warning(f"{len(conflicts)} appointment(s) have status 'Conflict': they overlapped another booking for the same doctor "
+                       "before the overlap check existed, and the schema upgrade kept only the earlier booking. Please rebook or cancel them.")
+            with st.expander("Conflicting appointments"):
+                st.dataframe(pd.DataFrame(conflicts), use_container_width=True)
+        doctors = cached_doctors(settings.DB_PATH, write_generation(settings.DB_PATH))
+        f1, f2, f3 = st.columns(3)
+        specialty = f1.selectbox("Specialty", [""] + sorted({d["specialty"] for d in doctors if d["specialty"]}))
+        doctor_names = {f"{d['name']} ({d['specialty']})": d["doctor_id"] for d in doctors if not specialty or d["specialty"] == specialty}
+        doctor = f2.selectbox("Doctor", [""] + list(doctor_names))
+        status = f3.selectbox("Status", ["", "Booked", "Completed", "Cancelled", "Conflict"])
+        f4, f5, f6 = st.columns(3)
+        start_date = f4.date_input("From", value=None)
+        end_date = f5.date_input("To", value=None)
+        patient_prefix = f6.text_input("Patient starts with", key="appt_patient_prefix").strip()
+        filters = tuple((k, v) for k, v in (
+            ("doctor_id", doctor_names.get(doctor)),
+            ("specialty", specialty or None),
+            ("status", status or None),
+            ("start_date", start_date.isoformat() if start_date else None),
+            ("end_date", end_date.isoformat() if end_date else None),
+            ("patient_prefix", patient_prefix or None),
+        ) if v is not None)
+        appts = paged_rows("appointments_page", _fetch_appointments, filters)
+        st.dataframe(pd.DataFrame(appts["rows"]), use_container_width=True)
+        st.caption(f"{len(appts['rows'])} loaded" + ("" if appts["cursor"] else " (all)"))
+        st.button("Load more appointments", on_click=load_more, args=("appointments_page", _fetch_appointments), disabled=not appts["cursor"])
 
 with tab3:
     st.subheader("Knowledge Base (RAG Sources)")
@@ -70,3 +193,23 @@ with tab3:
         st.code("\n".join(sorted(pdfs)[:80]))
     except Exception as e:
         st.warning(f"Could not list sources: {e}")
+    with st.expander("Index cache stats"):
+        st.json(kb_stats())
+
+with tab4:
+    st.subheader("Pipeline Performance")
+    st.caption(f"Per-node latency from traced graph runs (stored in traces.db next to the DB; export mode: {settings.TRACE_EXPORT}).")
+    window = st.selectbox("Window", ["Last hour", "Last 24 hours", "All time"], index=1)
+    import time
+    since = {"Last hour": time.time() - 3600, "Last 24 hours": time.time() - 86400}.get(window)
+    nodes = node_percentiles(settings.DB_PATH, since=since)
+    if nodes:
+        df = pd.DataFrame(nodes).set_index("name")
+        st.bar_chart(df[["p50_ms", "p95_ms"]])
+        st.dataframe(df)
+    else:
+        st.info("No traced runs yet — send a message from the Assistant tab.")
+    with st.expander("Database calls"):
+        calls = db_percentiles(settings.DB_PATH, since=since)
+        if calls:
+            st.dataframe(pd.DataFrame(calls).set_index("name")[["count", "p50_ms", "p95_ms", "max_ms", "errors"]])
@@ -0,0 +1,75 @@
+"""Multi-threaded stress check for reserve_slot: zero double bookings under contention.
+
+Many threads (each with its own pooled connection) race to book the same doctor,
+day and starting slot; reserve_slot must hand each one a distinct slot or None.
+Exits non-zero if any two Booked appointments for a doctor overlap.
+
+Usage:
+    python -m benchmarks.booking_contention --threads 32 --requests 400
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from src import db
+
+OVERLAP_SQL = """
+SELECT COUNT(*) FROM appointments a
+JOIN appointments b ON a.doctor_id=b.doctor_id AND a.appointment_id<b.appointment_id
+WHERE a.status='Booked' AND b.status='Booked' AND a.start_time<b.end_time AND b.start_time<a.end_time
+"""
+
+def run(db_path: str, threads: int, requests: int, doctors: int, day: str):
+    db.init_db(db_path)
+    with db.transaction(db_path) as conn:
+        conn.executemany("INSERT INTO doctors(name, specialty) VALUES (?,?)", [(f"Dr. Load{i}", "Cardiology") for i in range(doctors)])
+        doctor_ids = [r[0] for r in conn.execute("SELECT doctor_id FROM doctors ORDER BY doctor_id").fetchall()]
+
+    def book(i: int):
+        doctor_id = doctor_ids[i % len(doctor_ids)]
+        t0 = time.perf_counter()
+        appt = db.reserve_slot(db_path, f"Load Patient {i}", doctor_id, f"{day}T09:00:00", f"{day}T09:30:00",
+                               reason="stress", search_days=1, max_attempts=50)
+        return appt, time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        results = list(ex.map(book, range(requests)))
+    elapsed = time.perf_counter() - t0
+
+    booked = [a for a, _ in results if a]
+    latencies = sorted(dt for _, dt in results)
+    overlaps = db.get_connection(db_path).execute(OVERLAP_SQL).fetchone()[0]
+    return {
+        "threads": threads,
+        "requests": requests,
+        "doctors": doctors,
+        "booked": len(booked),
+        "rejected": requests - len(booked),
+        "retried": sum(1 for a in booked if a["attempts"] > 1),
+        "double_bookings": int(overlaps),
+        "throughput_per_s": round(requests / elapsed, 1),
+        "latency_ms_p50": round(latencies[len(latencies) // 2] * 1000, 2),
+        "latency_ms_p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--threads", type=int, default=32)
+    ap.add_argument("--requests", type=int, default=400)
+    ap.add_argument("--doctors", type=int, default=4)
+    ap.add_argument("--day", default="2030-01-07")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run(str(Path(tmp) / "contention.db"), args.threads, args.requests, args.doctors, args.day)
+        db.close_all_connections()
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["double_bookings"] else 0)
+
+if __name__ == "__main__":
+    main()
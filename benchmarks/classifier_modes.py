@@ -0,0 +1,71 @@
+"""Compare the split (intent + sentiment) and fused classifier modes.
+
+Usage:
+    python -m benchmarks.classifier_modes --provider groq --repeat 3
+"""
+import argparse
+import json
+import statistics
+import time
+
+from langchain_core.callbacks import get_usage_metadata_callback
+
+from src.llm import get_llm
+from src.tools import detect_intent, analyze_sentiment, classify_message
+
+SAMPLE_MESSAGES = [
+    "Book an appointment with Dr. Smith (Cardiology) next Monday morning for Anjali",
+    "Add record for patient Anjali: Diabetes diagnosed 2019, on Metformin",
+    "Show medical history for patient Ramesh",
+    "What are symptoms and treatment options for hypertension?",
+    "I'm really worried, my chest has been hurting since yesterday. What should I do?",
+    "Thanks, that was helpful!",
+]
+
+def _split(llm, message):
+    return {"intent": detect_intent(llm, message), "sentiment": analyze_sentiment(llm, message)}
+
+def _fused(llm, message):
+    return classify_message(llm, message)
+
+def _run_mode(llm, fn, messages, repeat):
+    latencies, prompt_tokens, completion_tokens, fallbacks = [], 0, 0, 0
+    for _ in range(repeat):
+        for m in messages:
+            with get_usage_metadata_callback() as cb:
+                t0 = time.perf_counter()
+                out = fn(llm, m)
+                latencies.append(time.perf_counter() - t0)
+            for usage in cb.usage_metadata.values():
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+            if out.get("classifier") == "split_fallback":
+                fallbacks += 1
+    n = len(latencies)
+    latencies.sort()
+    return {
+        "calls": n,
+        "latency_ms_mean": round(statistics.mean(latencies) * 1000, 1),
+        "latency_ms_p50": round(latencies[n // 2] * 1000, 1),
+        "latency_ms_p95": round(latencies[min(n - 1, int(n * 0.95))] * 1000, 1),
+        "prompt_tokens_per_msg": round(prompt_tokens / n, 1),
+        "completion_tokens_per_msg": round(completion_tokens / n, 1),
+        "fallbacks": fallbacks,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--provider", default="groq")
+    ap.add_argument("--repeat", type=int, default=1)
+    args = ap.parse_args()
+
+    llm = get_llm(args.provider)
+    report = {
+        "provider": args.provider,
+        "split": _run_mode(llm, _split, SAMPLE_MESSAGES, args.repeat),
+        "fused": _run_mode(llm, _fused, SAMPLE_MESSAGES, args.repeat),
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
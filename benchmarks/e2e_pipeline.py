@@ -0,0 +1,172 @@
+"""End-to-end pipeline benchmark over a synthetic hospital with a fake LLM.
+
+Builds (or reuses) a synthetic dataset and KB, then drives every intent path
+(book_appointment, update_records, retrieve_history, medical_info, general)
+through run_graph. Reports throughput, latency percentiles, LLM calls per
+message and peak RSS as JSON. With --baseline, exits non-zero when a scenario's
+p95 or throughput regresses beyond --tolerance; it always exits non-zero on
+errors or misrouted messages.
+
+Usage:
+    python -m benchmarks.e2e_pipeline --scale 10k --iterations 50 --latency-ms 20
+    python -m benchmarks.e2e_pipeline --scale 100k --output new.json --baseline old.json
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from config import settings
+from src.batch import run_graph_batch
+from src.kb import init_kb, _peak_rss_bytes
+from src.orchestrator import build_graph, run_graph
+
+from benchmarks.fake_llm import FAKE_EMBEDDING_MODEL, install
+from benchmarks.synthetic import SCALES, SPECIALTIES, TOPICS, build_dataset, patient_name
+
+SCENARIOS = ("book_appointment", "update_records", "retrieve_history", "medical_info", "general")
+
+def scenario_messages(scenario: str, n: int, patients: int, seed: int=11) -> List[str]:
+    rnd = random.Random(f"{scenario}:{seed}")
+    topics = list(TOPICS)
+    out = []
+    for i in range(n):
+        name = patient_name(rnd.randrange(patients))
+        if scenario == "book_appointment":
+            out.append(f"Book an appointment with a {rnd.choice(SPECIALTIES)} doctor tomorrow {rnd.choice(['morning', 'afternoon'])} for {name}")
+        elif scenario == "update_records":
+            out.append(f"Add record for patient {name}: {rnd.choice(topics)} follow-up, BP {rnd.randint(110, 150)}/{rnd.randint(70, 95)}")
+        elif scenario == "retrieve_history":
+            out.append(f"Show medical history for patient {name}")
+        elif scenario == "medical_info":
+            out.append(f"What are the symptoms and treatment options for {rnd.choice(topics)} (case {i})?")
+        else:
+            out.append(rnd.choice(["Thanks, that was helpful!", "Hello there", "Good morning team"]))
+    return out
+
+def _percentile(values: List[float], q: float) -> float:
+    s = sorted(values)
+    return round(s[min(len(s) - 1, int(round(q * (len(s) - 1))))], 1) if s else 0.0
+
+def run_scenario(graph, scenario: str, messages: List[str], paths: Dict[str, str], concurrency: int) -> Dict[str, Any]:
+    latencies, errors, misrouted, failed_actions, llm_calls, tokens, saved = [], 0, 0, 0, 0, 0, 0
+    t0 = time.perf_counter()
+    if concurrency > 1:
+        results = run_graph_batch(graph, messages, paths["db_path"], paths["faiss_dir"], FAKE_EMBEDDING_MODEL, max_concurrency=concurrency)
+    else:
+        results = []
+        for m in messages:
+            t1 = time.perf_counter()
+            try:
+                out = run_graph(graph, m, paths["db_path"], paths["faiss_dir"], FAKE_EMBEDDING_MODEL)
+                results.append({"result": out, "elapsed_ms": (time.perf_counter() - t1) * 1000})
+            except Exception as e:
+                results.append({"error": f"{type(e).__name__}: {e}", "elapsed_ms": (time.perf_counter() - t1) * 1000})
+    elapsed = time.perf_counter() - t0
+    for res in results:
+        latencies.append(res["elapsed_ms"])
+        if "error" in res:
+            errors += 1
+            continue
+        out = res["result"]
+        if (out.get("intent") or {}).get("intent") != scenario:
+            misrouted += 1
+        if (out.get("action") or {}).get("ok") is False:
+            failed_actions += 1
+        saved += (out.get("context_stats") or {}).get("tokens_saved", 0)
+        for span in out.get("trace", []):
+            llm_calls += span.get("llm_calls", 0)
+            tokens += span.get("prompt_tokens", 0) + span.get("completion_tokens", 0)
+    n = len(messages)
+    return {
+        "messages": n,
+        "errors": errors,
+        "misrouted": misrouted,
+        "failed_actions": failed_actions,
+        "throughput_per_s": round(n / elapsed, 2) if elapsed else 0.0,
+        "latency_ms_p50": _percentile(latencies, 0.50),
+        "latency_ms_p95": _percentile(latencies, 0.95),
+        "latency_ms_p99": _percentile(latencies, 0.99),
+        "latency_ms_mean": round(statistics.fmean(latencies), 1) if latencies else 0.0,
+        "llm_calls_per_message": round(llm_calls / n, 2) if n else 0.0,
+        "tokens_per_message": round(tokens / n, 1) if n else 0.0,
+        "prompt_tokens_saved_per_message": round(saved / n, 1) if n else 0.0,
+    }
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    for name, cur in report["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        if old["latency_ms_p95"] and cur["latency_ms_p95"] > old["latency_ms_p95"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {old['latency_ms_p95']} -> {cur['latency_ms_p95']} ms")
+        if old["throughput_per_s"] and cur["throughput_per_s"] < old["throughput_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {old['throughput_per_s']} -> {cur['throughput_per_s']}/s")
+    return regressions
+
+def run(args, provider, workdir: str) -> List[str]:
+    t0 = time.perf_counter()
+    paths = build_dataset(workdir, args.scale)
+    dataset_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    init_kb(paths["pdf_dir"], paths["faiss_dir"], FAKE_EMBEDDING_MODEL)
+    kb_s = time.perf_counter() - t0
+    graph = build_graph(provider, classifier=args.classifier)
+
+    report = {"scale": args.scale, "workdir": workdir, "classifier": args.classifier, "fast_router": settings.FAST_ROUTER_ENABLED,
+              "llm_latency_ms": args.latency_ms, "concurrency": args.concurrency,
+              "setup_seconds": {"dataset": round(dataset_s, 2), "kb": round(kb_s, 2)}, "scenarios": {}}
+    patients = SCALES[args.scale]["patients"]
+    for scenario in [s for s in args.scenarios.split(",") if s]:
+        messages = scenario_messages(scenario, args.iterations, patients)
+        report["scenarios"][scenario] = run_scenario(graph, scenario, messages, paths, args.concurrency)
+    report["peak_rss_mb"] = round(_peak_rss_bytes() / 2**20, 1)
+
+    failures = [f"{name}: {r['errors']} errors, {r['misrouted']} misrouted"
+                for name, r in report["scenarios"].items() if r["errors"] or r["misrouted"]]
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            failures += compare(report, json.load(f), args.tolerance)
+    report["failures"] = failures
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    return failures
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--scale", choices=sorted(SCALES), default="10k")
+    ap.add_argument("--workdir", default=None, help="dataset/KB directory; reused across runs of the same scale")
+    ap.add_argument("--iterations", type=int, default=50, help="messages per scenario")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS))
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="simulated latency per LLM call")
+    ap.add_argument("--ms-per-token", type=float, default=0.0)
+    ap.add_argument("--classifier", choices=["split", "fused"], default=settings.CLASSIFIER_MODE)
+    ap.add_argument("--no-fast-router", action="store_true", help="send every message through the LLM classifier")
+    ap.add_argument("--response-cache", action="store_true", help="leave the semantic response cache on")
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--output", default=None)
+    ap.add_argument("--baseline", default=None)
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    args = ap.parse_args()
+
+    settings.FAST_ROUTER_ENABLED = not args.no_fast_router
+    settings.RESPONSE_CACHE_ENABLED = args.response_cache
+    provider = install(latency_ms=args.latency_ms, ms_per_token=args.ms_per_token)
+    if args.workdir:
+        failures = run(args, provider, args.workdir)
+    else:
+        # without --workdir the dataset and KB are throwaway
+        with tempfile.TemporaryDirectory(prefix=f"hc_bench_{args.scale}_") as workdir:
+            failures = run(args, provider, workdir)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
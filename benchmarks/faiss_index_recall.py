@@ -0,0 +1,88 @@
+"""Recall@k vs latency for the FAISS index types supported by src.kb.
+
+Builds each index type over the same synthetic (clustered) vectors with
+build_faiss_index, queries it with the configured nprobe/efSearch, and compares
+results against the exact flat baseline. Queries are held-out points drawn
+around the same cluster centers as the indexed vectors.
+
+Defaults (200k x 384, nlist=1024, nprobe=16, pq_m=48, hnsw_m=32, efSearch=64, k=4),
+single process, no GPU:
+
+    type      recall@4  query_ms  index_mb  build_s
+    flat      1.0       11.9      307       0.3
+    ivf_flat  1.0       0.79      310       41
+    ivf_pq    0.27      0.34      13        59
+    hnsw_sq   0.93      0.43      131       64
+
+Usage:
+    python -m benchmarks.faiss_index_recall --vectors 1000000 --dim 384 --queries 500 --k 4
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from config import settings
+from src.kb import INDEX_TYPES, build_faiss_index, apply_search_params, index_params
+
+def synthetic_vectors(n: int, d: int, clusters: int=256, seed: int=0) -> np.ndarray:
+    # clustered data behaves more like sentence embeddings than iid gaussian noise
+    rnd = np.random.default_rng(seed)
+    centers = rnd.standard_normal((clusters, d)).astype("float32")
+    labels = rnd.integers(0, clusters, size=n)
+    x = centers[labels] + 0.35 * rnd.standard_normal((n, d)).astype("float32")
+    faiss.normalize_L2(x)
+    return x
+
+def _index_bytes(index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+def bench_index(index_type: str, xb: np.ndarray, xq: np.ndarray, k: int, train_size: int, truth: np.ndarray=None):
+    t0 = time.perf_counter()
+    index, built = build_faiss_index(index_type, xb[:train_size], index_params())
+    index.add(xb)
+    build_s = time.perf_counter() - t0
+    apply_search_params(index)
+    t0 = time.perf_counter()
+    _, ids = index.search(xq, k)
+    search_s = time.perf_counter() - t0
+    out = {
+        "index_type": index_type,
+        "built_index_type": built,
+        "build_seconds": round(build_s, 2),
+        "index_mb": round(_index_bytes(index) / 1e6, 1),
+        "query_ms": round(search_s * 1000 / len(xq), 3),
+    }
+    if truth is not None:
+        hits = sum(len(set(ids[i]) & set(truth[i])) for i in range(len(xq)))
+        out[f"recall@{k}"] = round(hits / (len(xq) * k), 4)
+    return out, ids
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--vectors", type=int, default=200_000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--types", default=",".join(INDEX_TYPES))
+    args = ap.parse_args()
+
+    # queries are held-out points from the same clusters; a different seed would draw new centers
+    x = synthetic_vectors(args.vectors + args.queries, args.dim)
+    xb, xq = x[:args.vectors], x[args.vectors:]
+    train_size = min(args.vectors, settings.FAISS_TRAIN_SIZE)
+
+    baseline, truth = bench_index("flat", xb, xq, args.k, train_size)
+    baseline[f"recall@{args.k}"] = 1.0
+    results = [baseline]
+    for t in args.types.split(","):
+        if t != "flat":
+            results.append(bench_index(t, xb, xq, args.k, train_size, truth)[0])
+    print(json.dumps({"vectors": args.vectors, "dim": args.dim, "params": index_params(),
+                      "nprobe": settings.FAISS_NPROBE, "ef_search": settings.FAISS_HNSW_EF_SEARCH,
+                      "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Deterministic offline chat model and embeddings for benchmarks.
+
+`install()` registers a "fake" provider with src.llm.get_llm and seeds the KB
+embedder cache, so build_graph("fake") runs the full pipeline without Groq or Ollama.
+Replies depend only on the prompt text; latency is simulated per call.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Any, Dict, List
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from src.kb import register_embeddings
+from src.llm import register_provider
+
+FAKE_PROVIDER = "fake"
+FAKE_EMBEDDING_MODEL = "fake-embeddings-384"
+
+SPECIALTIES = ("cardiology", "dermatology", "general medicine", "endocrinology", "neurology", "oncology")
+_NAME_RE = re.compile(r"\b(?:for|patient)\s+([A-Z][a-z]+(?:\s[A-Z][a-z]+)?)")
+_DOCTOR_RE = re.compile(r"\bDr\.?\s+([A-Z][a-z]+\d*)")
+_DATE_RE = re.compile(r"\b(today|tomorrow|next week|next (?:monday|tuesday|wednesday|thursday|friday)|\d{4}-\d{2}-\d{2})\b", re.I)
+_TIME_RE = re.compile(r"\b(morning|afternoon|evening)\b", re.I)
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def fake_intent(message: str) -> Dict[str, Any]:
+    low = message.lower()
+    name = _NAME_RE.search(message)
+    extracted = {"patient_name": name.group(1) if name else None}
+    if "book" in low or "appointment" in low:
+        label = "book_appointment"
+        doctor = _DOCTOR_RE.search(message)
+        date = _DATE_RE.search(message)
+        tod = _TIME_RE.search(message)
+        extracted.update({
+            "doctor": f"Dr. {doctor.group(1)}" if doctor else None,
+            "specialty": next((s.title() for s in SPECIALTIES if s in low), None),
+            "date_hint": date.group(1) if date else None,
+            "time_hint": tod.group(1) if tod else None,
+        })
+    elif low.startswith("add record") or "update record" in low:
+        label = "update_records"
+    elif "history" in low or "records for" in low:
+        label = "retrieve_history"
+    elif "?" in message or any(w in low for w in ("symptom", "treatment", "what is", "side effect")):
+        label = "medical_info"
+        extracted["symptoms/topic"] = message.rstrip("?")
+    else:
+        label = "general"
+    return {"intent": label, "confidence": 0.9, "extracted": extracted}
+
+def fake_sentiment(message: str) -> Dict[str, Any]:
+    low = message.lower()
+    if any(w in low for w in ("worried", "scared", "pain", "angry", "terrible")):
+        return {"sentiment": "negative", "intensity": 0.7, "emotions": ["worry"], "notes": "distressed"}
+    if any(w in low for w in ("thanks", "thank you", "great", "helpful")):
+        return {"sentiment": "positive", "intensity": 0.6, "emotions": ["gratitude"], "notes": ""}
+    return {"sentiment": "neutral", "intensity": 0.1, "emotions": [], "notes": ""}
+
+class FakeChatModel(BaseChatModel):
+    """Answers the router/sentiment/classifier/response prompts of src.tools deterministically."""
+
+    latency_ms: float = 50.0
+    ms_per_token: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-healthcare"
+
+    def _reply(self, messages) -> str:
+        system = messages[0].content if messages else ""
+        human = messages[-1].content if messages else ""
+        if "In ONE pass" in system:
+            return json.dumps({"intent": fake_intent(human), "sentiment": fake_sentiment(human)})
+        if "task router" in system:
+            return json.dumps(fake_intent(human))
+        if system.startswith("Return STRICT JSON: sentiment"):
+            return json.dumps(fake_sentiment(human))
+        digest = hashlib.sha1(human.encode("utf-8")).hexdigest()[:8]
+        return (f"Thanks for reaching out. Based on the information available (ref {digest}), here is a short "
+                "summary. This is general educational information, not a diagnosis; please contact your care "
+                "team or emergency services if symptoms are severe.")
+
+    def _result(self, messages) -> tuple:
+        self.calls += 1
+        text = self._reply(messages)
+        usage = {"input_tokens": sum(_estimate_tokens(str(m.content)) for m in messages), "output_tokens": _estimate_tokens(text)}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        delay = (self.latency_ms + self.ms_per_token * usage["output_tokens"]) / 1000
+        return text, usage, delay
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage, delay = self._result(messages)
+        time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage, delay = self._result(messages)
+        await asyncio.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    def _chunks(self, text: str, usage: Dict[str, int]) -> List[ChatGenerationChunk]:
+        words = text.split(" ")
+        return [ChatGenerationChunk(message=AIMessageChunk(content=w + (" " if i < len(words) - 1 else ""),
+                                                           usage_metadata=usage if i == len(words) - 1 else None))
+                for i, w in enumerate(words)]
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage, delay = self._result(messages)
+        time.sleep(delay)
+        for chunk in self._chunks(text, usage):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage, delay = self._result(messages)
+        await asyncio.sleep(delay)
+        for chunk in self._chunks(text, usage):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+def install(latency_ms: float=50.0, ms_per_token: float=0.0, embedding_size: int=384) -> str:
+    """Register the fake provider and embeddings; returns the provider name for build_graph."""
+    register_provider(FAKE_PROVIDER, lambda rate_limiter: FakeChatModel(latency_ms=latency_ms, ms_per_token=ms_per_token,
+                                                                       rate_limiter=rate_limiter))
+    register_embeddings(FAKE_EMBEDDING_MODEL, DeterministicFakeEmbedding(size=embedding_size))
+    return FAKE_PROVIDER
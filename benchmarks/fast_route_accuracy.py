@@ -0,0 +1,104 @@
+"""Accuracy, hit-rate and latency of the rule-based fast-path router.
+
+Each labelled case is (message, expected intent). An expected intent of None means
+the message is ambiguous and the router must fall back to the LLM. Exits non-zero
+if any routed answer is wrong (the fast path must never beat the LLM to a bad label).
+
+Usage:
+    python -m benchmarks.fast_route_accuracy
+"""
+import json
+import sys
+import time
+
+from src.tools import fast_route, fast_route_stats
+
+DOCTORS = [
+    {"doctor_id": 1, "name": "Dr. Smith", "specialty": "Cardiology"},
+    {"doctor_id": 2, "name": "Dr. Patel", "specialty": "Dermatology"},
+    {"doctor_id": 3, "name": "Dr. Chen", "specialty": "General Medicine"},
+    {"doctor_id": 4, "name": "Dr. Rao", "specialty": "Endocrinology"},
+]
+PATIENTS = {"Anjali", "Ramesh", "Priya", "Vikram"}
+
+CASES = [
+    ("Show medical history for patient Ramesh", "retrieve_history"),
+    ("Show me the records of Priya", "retrieve_history"),
+    ("Can you pull up the medical history for Vikram?", "retrieve_history"),
+    ("Past visits for patient Anjali please", "retrieve_history"),
+    ("Add record for patient Anjali: Diabetes diagnosed 2019, on Metformin", "update_records"),
+    ("Update notes for Ramesh: BP 130/85 today", "update_records"),
+    ("Please add a note for patient Priya - allergic to penicillin", "update_records"),
+    ("Book an appointment with Dr. Smith tomorrow morning for Anjali", "book_appointment"),
+    ("Book an appointment with Cardiology next Monday morning for Anjali", "book_appointment"),
+    ("Schedule a consultation with a dermatologist on Friday afternoon for Ramesh", "book_appointment"),
+    ("Book an appointment with Dr. Rao for patient Vikram on 2030-01-15", "book_appointment"),
+    ("What are symptoms and treatment options for hypertension?", "medical_info"),
+    ("What are the side effects of metformin?", "medical_info"),
+    ("Symptoms of type 2 diabetes", "medical_info"),
+    ("How to manage asthma at home?", "medical_info"),
+    ("Causes of migraine", "medical_info"),
+    # ambiguous / underspecified: must fall back to the LLM
+    ("Book an appointment tomorrow", None),
+    ("Show medical history", None),
+    ("What are Ramesh's symptoms of concern from his history?", None),
+    ("What are the symptoms of Ramesh's diabetes?", None),
+    ("What are the side effects of Anjali Sharma's insulin?", None),
+    ("Hi there, thanks for the help!", None),
+    ("I feel dizzy and my chest hurts", None),
+    ("Add a note and book an appointment for Anjali", None),
+]
+
+# (message, expected patient_name) for routed messages; capitalized words after the name are not part of it
+NAME_CASES = [
+    # only a full, known name is accepted; anything else goes to the LLM classifier
+    ("Add a note for Anjali Metformin started in 2019", None),
+    ("Update notes for Ramesh BP 130/85 today", None),
+    ("Add record for patient Anjali Diabetes diagnosed 2019", None),
+    ("Add record for patient Unknown Person: BP fine", None),
+    ("Add record for patient Anjali Sharma: started insulin", None),
+    ("Show medical history for Ramesh Kumar", None),
+    ("Add a note for Anjali: started insulin", "Anjali"),
+    ("Show medical history for patient Ramesh Monday", "Ramesh"),
+]
+
+def _lookup(names):
+    return [n for n in names if n in PATIENTS]
+
+def main():
+    correct, wrong, fallbacks_ok, missed = 0, [], 0, 0
+    t0 = time.perf_counter()
+    for message, expected in CASES:
+        routed = fast_route(message, doctors=DOCTORS, patient_lookup=_lookup)
+        got = routed["intent"] if routed else None
+        if got is None:
+            if expected is None:
+                fallbacks_ok += 1
+            else:
+                missed += 1
+        elif got == expected:
+            correct += 1
+        else:
+            wrong.append({"message": message, "expected": expected, "got": got})
+    for message, expected in NAME_CASES:
+        routed = fast_route(message, doctors=DOCTORS, patient_lookup=_lookup)
+        got = routed["extracted"].get("patient_name") if routed else None
+        if got != expected:
+            wrong.append({"message": message, "expected_patient": expected, "got_patient": got})
+    routed_total = correct + len(wrong)
+    report = {
+        "cases": len(CASES),
+        "routed": routed_total,
+        "precision": round(correct / routed_total, 4) if routed_total else 1.0,
+        "coverage_of_unambiguous": round(correct / sum(1 for _, e in CASES if e), 4),
+        "correct_fallbacks": fallbacks_ok,
+        "missed_fast_path": missed,
+        "wrong": wrong,
+        "wall_ms": round((time.perf_counter() - t0) * 1000, 3),
+        "stats": fast_route_stats(),
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if wrong else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""EXPLAIN QUERY PLAN regression check for the hot db.py queries.
+
+Builds a synthetic database (1M patient records / appointments by default), then
+asserts every hot query is served by an index rather than a full table scan.
+Exits non-zero on a regression.
+
+Usage:
+    python -m benchmarks.query_plans --rows 1000000
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from src import db
+
+def build_dataset(db_path: str, rows: int, patients: int=10000, doctors: int=200, seed: int=7):
+    rnd = random.Random(seed)
+    db.init_db(db_path)
+    specialties = ["Cardiology", "Dermatology", "General Medicine", "Endocrinology", "Neurology", "Oncology"]
+    base = datetime(2024, 1, 1, 9, 0)
+    with db.transaction(db_path) as conn:
+        conn.executemany("INSERT INTO doctors(name, specialty) VALUES (?,?)",
+                         [(f"Dr. Synthetic{i}", specialties[i % len(specialties)]) for i in range(doctors)])
+        conn.executemany("INSERT INTO patients(name, dob, gender) VALUES (?,?,?)",
+                         [(f"Patient{i}", "1980-01-01", "F" if i % 2 else "M") for i in range(patients)])
+    batch = 50000
+    taken = set()  # one Booked row per (doctor, start); the overlap trigger rejects the rest
+    for offset in range(0, rows, batch):
+        n = min(batch, rows - offset)
+        recs, appts = [], []
+        for _ in range(n):
+            pid = rnd.randint(1, patients)
+            created = (base + timedelta(minutes=rnd.randint(0, 60 * 24 * 900))).isoformat()
+            recs.append((pid, created, "Note", "synthetic note", "bench"))
+            start = base + timedelta(days=rnd.randint(0, 900), minutes=30 * rnd.randint(0, 15))
+            doctor_id = rnd.randint(1, doctors)
+            status = "Completed" if (doctor_id, start) in taken else "Booked"
+            taken.add((doctor_id, start))
+            appts.append((pid, doctor_id, start.isoformat(), (start + timedelta(minutes=30)).isoformat(), status, "bench", created))
+        with db.transaction(db_path) as conn:
+            conn.executemany("INSERT INTO patient_records(patient_id, created_at, record_type, content, source) VALUES (?,?,?,?,?)", recs)
+            conn.executemany("INSERT INTO appointments(patient_id, doctor_id, start_time, end_time, status, reason, created_at) VALUES (?,?,?,?,?,?,?)", appts)
+    db.get_connection(db_path).execute("ANALYZE")
+
+TABLES = ("patients", "patient_records", "doctors", "appointments")
+
+HOT_QUERIES = {
+    "get_patient_records": (db.SQL_PATIENT_RECORDS, (42, 25), "idx_patient_records_patient_created"),
+    "find_free_slots": (db.SQL_BOOKED_INTERVALS.format(doctors="?,?,?"), (7, 8, 9, "2024-06-03", "2024-06-10"),
+                        ("idx_appointments_doctor_start", "ux_appointments_doctor_start_booked")),
+    "search_patient_records": (db.SQL_SEARCH_PATIENT_RECORDS, ('patient_id : "42" AND content : ("synthetic")', 10), "VIRTUAL TABLE INDEX"),
+    "find_doctors": (db.SQL_DOCTORS_BY_SPECIALTY, ("cardiology",), "idx_doctors_specialty_lower"),
+    "page_patients_prefix": (*db.patients_page_query("pat", ["Patient5", 6]), "idx_patients_name_nocase"),
+    "page_appointments": (*db.appointments_page_query(after=["2025-06-01", 10**6]), "idx_appointments_start"),
+    "page_appointments_status": (*db.appointments_page_query(status="Booked", after=["2025-06-01", 10**6]), "idx_appointments_status_start"),
+    "page_appointments_doctor": (*db.appointments_page_query(doctor_id=7, start_date="2024-06-01", end_date="2024-06-30"),
+                                 ("idx_appointments_doctor_start", "ux_appointments_doctor_start_booked")),
+}
+
+def check_plans(db_path: str, repeat: int=200):
+    conn = db.get_connection(db_path)
+    report, failures = {}, []
+    for name, (sql, params, expected_index) in HOT_QUERIES.items():
+        plan = [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, params).fetchall()
+        avg_ms = (time.perf_counter() - t0) * 1000 / repeat
+        expected = expected_index if isinstance(expected_index, tuple) else (expected_index,)
+        uses_index = any(ix in p for ix in expected for p in plan)
+        # "SCAN a" over the page subquery's few materialized rows is fine; only table scans count
+        full_scan = any(p.startswith("SCAN") and "USING" not in p and p.split()[1] in TABLES for p in plan)
+        ok = uses_index and not full_scan
+        report[name] = {"plan": plan, "expected_index": expected_index, "ok": ok, "avg_ms": round(avg_ms, 3)}
+        if not ok:
+            failures.append(name)
+    return report, failures
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--db-path", default=None, help="reuse/keep the synthetic DB at this path")
+    args = ap.parse_args()
+
+    tmp = None
+    db_path = args.db_path
+    if not db_path:
+        tmp = tempfile.TemporaryDirectory()
+        db_path = str(Path(tmp.name) / "plans.db")
+    if not Path(db_path).exists():
+        t0 = time.perf_counter()
+        build_dataset(db_path, args.rows)
+        print(f"built {args.rows} rows in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    report, failures = check_plans(db_path)
+    print(json.dumps({"rows": args.rows, "schema_version": db.schema_version(db_path), "queries": report}, indent=2))
+    db.close_all_connections()
+    if tmp:
+        tmp.cleanup()
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
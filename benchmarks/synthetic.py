@@ -0,0 +1,156 @@
+"""Synthetic hospital dataset: patients, doctors, appointments, records and PDF sources.
+
+Scales are named by the number of appointment / patient-record rows:
+10k, 100k and 1m. Output is deterministic for a given seed.
+
+Usage:
+    python -m benchmarks.synthetic --scale 100k --out /tmp/hc_bench
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+from src import db
+
+SCALES = {
+    "10k": {"rows": 10_000, "patients": 1_000, "doctors": 50, "pdfs": 20},
+    "100k": {"rows": 100_000, "patients": 10_000, "doctors": 200, "pdfs": 100},
+    "1m": {"rows": 1_000_000, "patients": 100_000, "doctors": 1_000, "pdfs": 400},
+}
+
+SPECIALTIES = ["Cardiology", "Dermatology", "General Medicine", "Endocrinology", "Neurology", "Oncology"]
+FIRST_NAMES = ["Anjali", "Ramesh", "Priya", "Arjun", "Meera", "Vikram", "Sara", "John", "Maria", "Wei", "Fatima", "Lucas",
+               "Aisha", "Daniel", "Emma", "Omar", "Nina", "Ravi", "Leila", "Tom", "Kavya", "Mateo", "Hana", "Ibrahim"]
+_SYLLABLES = ["ka", "ro", "vi", "ma", "su", "le", "ta", "ni", "po", "de", "ri", "sha", "mo", "ze", "lu", "ba"]
+TOPICS = {
+    "hypertension": "High blood pressure often has no symptoms. Treatment includes lifestyle change, ACE inhibitors and diuretics.",
+    "diabetes": "Type 2 diabetes causes thirst and fatigue. Metformin, diet and exercise are first-line treatment.",
+    "asthma": "Asthma causes wheezing and breathlessness. Inhaled corticosteroids and bronchodilators control symptoms.",
+    "migraine": "Migraine presents as throbbing headache with nausea. Triptans and preventive therapy are used.",
+    "eczema": "Eczema causes itchy inflamed skin. Emollients and topical steroids are common treatments.",
+    "hypothyroidism": "Hypothyroidism causes tiredness and weight gain. Levothyroxine replaces the missing hormone.",
+    "anemia": "Iron deficiency anemia causes fatigue and pallor. Iron supplements and diet changes help.",
+    "arrhythmia": "Arrhythmia causes palpitations. Beta blockers, anticoagulants or ablation may be advised.",
+}
+RECORD_TYPES = ["Diagnosis", "Prescription", "Lab Result", "Visit Note", "Allergy"]
+
+def _surname(i: int) -> str:
+    # base-16 syllable encoding: unique, pronounceable, letters only (matches name regexes)
+    parts = []
+    i += 16
+    while i:
+        i, r = divmod(i, len(_SYLLABLES))
+        parts.append(_SYLLABLES[r])
+    return "".join(parts).capitalize()
+
+def patient_name(i: int) -> str:
+    return f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {_surname(i // len(FIRST_NAMES))}"
+
+def doctor_name(i: int) -> str:
+    return f"Dr. {_surname(10_000 + i)}"
+
+def build_database(db_path: str, rows: int, patients: int, doctors: int, seed: int=7, start: date=None) -> Dict[str, int]:
+    """Bulk-load the hospital tables. Appointments are laid out per doctor in consecutive
+    30-minute slots (09:00-17:00, every fourth slot left free), half before `start` and half after."""
+    rnd = random.Random(seed)
+    start = start or date.today()
+    db.init_db(db_path)
+    with db.transaction(db_path) as conn:
+        conn.executemany("INSERT INTO doctors(name, specialty) VALUES (?,?)",
+                         [(doctor_name(i), SPECIALTIES[i % len(SPECIALTIES)]) for i in range(doctors)])
+        conn.executemany("INSERT INTO patients(name, dob, gender, phone, email) VALUES (?,?,?,?,?)",
+                         [(patient_name(i), f"{1940 + i % 60}-{1 + i % 12:02d}-{1 + i % 28:02d}", "F" if i % 2 else "M",
+                           f"+1-555-{i:07d}", f"patient{i}@example.org") for i in range(patients)])
+    span_days = -(-rows // (doctors * 12))
+    base = datetime.combine(start - timedelta(days=span_days // 2), datetime.min.time()).replace(hour=9)
+    topics = list(TOPICS)
+    batch = 50_000
+    for offset in range(0, rows, batch):
+        recs, appts = [], []
+        for k in range(offset, min(rows, offset + batch)):
+            pid = rnd.randint(1, patients)
+            slot = k // doctors
+            day, n = divmod(slot, 12)
+            begin = base + timedelta(days=day, minutes=30 * (n + n // 3))
+            created = (begin - timedelta(days=rnd.randint(1, 60))).isoformat(timespec="seconds")
+            status = "Booked" if begin.date() >= start else "Completed"
+            appts.append((pid, 1 + k % doctors, begin.isoformat(), (begin + timedelta(minutes=30)).isoformat(), status, "Follow-up", created))
+            topic = topics[k % len(topics)]
+            recs.append((pid, created, RECORD_TYPES[k % len(RECORD_TYPES)], f"{topic.title()} review. {TOPICS[topic]}", "synthetic"))
+        with db.transaction(db_path) as conn:
+            conn.executemany("INSERT INTO patient_records(patient_id, created_at, record_type, content, source) VALUES (?,?,?,?,?)", recs)
+            conn.executemany("INSERT INTO appointments(patient_id, doctor_id, start_time, end_time, status, reason, created_at) VALUES (?,?,?,?,?,?,?)", appts)
+    db.get_connection(db_path).execute("ANALYZE")
+    return {"rows": rows, "patients": patients, "doctors": doctors}
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(path: Path, pages: List[List[str]]):
+    """Minimal text-only PDF writer (Helvetica, one line per Tj) so benchmarks need no PDF library."""
+    objs = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        body = "BT /F1 10 Tf 14 TL 56 760 Td " + " ".join(f"({_pdf_escape(l)}) Tj T*" for l in lines) + " ET"
+        content = body.encode("latin-1", "replace")
+        objs.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        objs.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R /Resources << /Font << /F1 3 0 R >> >> >>" % len(objs))
+        kids.append(len(objs))
+    objs[1] = b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % k for k in kids) + b"] /Count %d >>" % len(kids)
+    out, offsets = b"%PDF-1.4\n", []
+    for i, obj in enumerate(objs):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % (i + 1) + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1) + b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, xref)
+    path.write_bytes(out)
+
+def build_pdfs(pdf_dir: str, count: int, pages: int=3, seed: int=7) -> int:
+    rnd = random.Random(seed)
+    out = Path(pdf_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    topics = list(TOPICS)
+    for i in range(count):
+        topic = topics[i % len(topics)]
+        doc = []
+        for p in range(pages):
+            lines = [f"{topic.title()} guideline {i} - section {p + 1}", TOPICS[topic]]
+            lines += [f"Note {j}: patients with {topic} and {rnd.choice(topics)} should be reviewed every {rnd.randint(2, 12)} weeks."
+                      for j in range(30)]
+            doc.append(lines)
+        write_pdf(out / f"{topic}_{i:04d}.pdf", doc)
+    return count
+
+def build_dataset(out_dir: str, scale: str, seed: int=7) -> Dict[str, str]:
+    """Create (or reuse) <out_dir>/healthcare.db and <out_dir>/pdf_sources for a scale."""
+    cfg = SCALES[scale]
+    root = Path(out_dir)
+    root.mkdir(parents=True, exist_ok=True)
+    paths = {"db_path": str(root / "healthcare.db"), "pdf_dir": str(root / "pdf_sources"), "faiss_dir": str(root / "faiss_index")}
+    marker = root / "dataset.json"
+    if marker.exists() and json.loads(marker.read_text()).get("scale") == scale:
+        return paths
+    build_database(paths["db_path"], cfg["rows"], cfg["patients"], cfg["doctors"], seed=seed)
+    build_pdfs(paths["pdf_dir"], cfg["pdfs"], seed=seed)
+    marker.write_text(json.dumps({"scale": scale, "seed": seed, **cfg}))
+    return paths
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--scale", choices=sorted(SCALES), default="10k")
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+    t0 = time.perf_counter()
+    paths = build_dataset(args.out, args.scale, seed=args.seed)
+    print(json.dumps({"scale": args.scale, "seconds": round(time.perf_counter() - t0, 1), **paths}, indent=2))
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,45 @@ class Settings:
     GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
     GROQ_MODEL: str = os.getenv("GROQ_MODEL", "llama-3.1-70b-versatile")
     OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "llama3")
+    GROQ_REQUESTS_PER_SECOND: float = float(os.getenv("GROQ_REQUESTS_PER_SECOND", "0.5"))
+    OLLAMA_REQUESTS_PER_SECOND: float = float(os.getenv("OLLAMA_REQUESTS_PER_SECOND", "0"))
+    CLASSIFIER_MODE: str = os.getenv("CLASSIFIER_MODE", "split")
+    FAST_ROUTER_ENABLED: bool = os.getenv("FAST_ROUTER_ENABLED", "1") == "1"
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
     DB_PATH: str = os.getenv("DB_PATH", "storage/healthcare.db")
     FAISS_DIR: str = os.getenv("FAISS_DIR", "storage/faiss_index")
     PDF_SOURCES_DIR: str = os.getenv("PDF_SOURCES_DIR", "data/pdf_sources")
     RECORDS_XLSX: str = os.getenv("RECORDS_XLSX", "data/records.xlsx")
+    KB_EMBED_BATCH_SIZE: int = int(os.getenv("KB_EMBED_BATCH_SIZE", "64"))
+    KB_INGEST_WORKERS: int = int(os.getenv("KB_INGEST_WORKERS", "0"))
+    FAISS_INDEX_TYPE: str = os.getenv("FAISS_INDEX_TYPE", "flat")  # flat | ivf_flat | ivf_pq | hnsw_sq
+    FAISS_NLIST: int = int(os.getenv("FAISS_NLIST", "1024"))
+    FAISS_NPROBE: int = int(os.getenv("FAISS_NPROBE", "16"))
+    FAISS_PQ_M: int = int(os.getenv("FAISS_PQ_M", "48"))
+    FAISS_PQ_BITS: int = int(os.getenv("FAISS_PQ_BITS", "8"))
+    FAISS_HNSW_M: int = int(os.getenv("FAISS_HNSW_M", "32"))
+    FAISS_HNSW_EF_SEARCH: int = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+    FAISS_TRAIN_SIZE: int = int(os.getenv("FAISS_TRAIN_SIZE", "50000"))
+    HYBRID_ALPHA: float = float(os.getenv("HYBRID_ALPHA", "0.5"))  # weight of vector vs BM25 score
+    RERANKER_MODEL: str = os.getenv("RERANKER_MODEL", "")  # e.g. cross-encoder/ms-marco-MiniLM-L-6-v2
+    RETRIEVAL_CONTEXT_CHARS: int = int(os.getenv("RETRIEVAL_CONTEXT_CHARS", "3600"))
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+    RESPONSE_CACHE_THRESHOLD: float = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.92"))
+    RESPONSE_CACHE_TTL_SECONDS: int = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "1200"))  # records passed to the response prompt
+    RECORD_SUMMARY_CHARS: int = int(os.getenv("RECORD_SUMMARY_CHARS", "400"))  # longer records are summarized
+    PROMPT_TOKENIZER: str = os.getenv("PROMPT_TOKENIZER", "")  # tiktoken encoding, used only if cached in TIKTOKEN_CACHE_DIR; else chars/4
+    PROMPT_TOKEN_BUDGET: int = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))  # response prompt, any provider without its own budget
+    PROMPT_TOKEN_BUDGET_GROQ: int = int(os.getenv("PROMPT_TOKEN_BUDGET_GROQ", "3000"))
+    PROMPT_TOKEN_BUDGET_OLLAMA: int = int(os.getenv("PROMPT_TOKEN_BUDGET_OLLAMA", "1500"))  # default num_ctx is 2048
+    CONTEXT_DEDUP_THRESHOLD: float = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))  # drop chunks this contained in earlier ones
+    ADB_READ_WORKERS: int = int(os.getenv("ADB_READ_WORKERS", "4"))  # reader threads shared by async sessions
+    ADB_WRITE_BATCH_SIZE: int = int(os.getenv("ADB_WRITE_BATCH_SIZE", "64"))  # max queued writes per grouped commit
+    ADB_WRITE_WINDOW_MS: float = float(os.getenv("ADB_WRITE_WINDOW_MS", "2"))  # wait for more writes before committing
+    DASHBOARD_CACHE_TTL_SECONDS: int = int(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "30"))
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "1") == "1"
+    TRACE_EXPORT: str = os.getenv("TRACE_EXPORT", "sqlite")  # sqlite | prometheus | both (sqlite is always written)
+    TRACE_PROMETHEUS_FILE: str = os.getenv("TRACE_PROMETHEUS_FILE", "storage/metrics.prom")
 
 settings = Settings()
@@ -0,0 +1,166 @@
+"""Async counterpart of src.db for use from event-loop code (arun_graph, arun_graph_batch).
+
+Reads run on a small shared thread pool, each worker with its own pooled connection.
+Writes go to one writer thread per database. It drains its queue and commits whatever
+has accumulated in a single transaction, giving each job its own SAVEPOINT so one
+failed write does not roll back the others. Many concurrent sessions therefore share
+a handful of threads and one commit (one WAL fsync) per batch rather than one per write.
+"""
+import asyncio
+import atexit
+import contextvars
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from config import settings
+from src import db
+
+_read_pool = None
+_read_pool_lock = threading.Lock()
+
+def _reader_pool() -> ThreadPoolExecutor:
+    global _read_pool
+    with _read_pool_lock:
+        if _read_pool is None:
+            _read_pool = ThreadPoolExecutor(max_workers=max(1, settings.ADB_READ_WORKERS), thread_name_prefix="adb-read")
+        return _read_pool
+
+async def run_read(func: Callable, *args, **kwargs):
+    """Run a blocking call on the reader pool; the caller's context (trace span) goes with it."""
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_reader_pool(), functools.partial(ctx.run, func, *args, **kwargs))
+
+def _resolve(fut: asyncio.Future, result: Any, error: BaseException):
+    if fut.cancelled():
+        return
+    if error is not None:
+        fut.set_exception(error)
+    else:
+        fut.set_result(result)
+
+class WriteQueue:
+    """Single writer thread for one database; see the module docstring."""
+
+    def __init__(self, db_path: str, max_batch: int=64, window_ms: float=2.0):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.batches = 0
+        self.jobs = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"adb-write:{db_path}", daemon=True)
+        self._thread.start()
+
+    def submit(self, func: Callable, *args, **kwargs) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._queue.put((loop, fut, contextvars.copy_context(), func, args, kwargs))
+        return fut
+
+    def close(self, timeout: float=5.0):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _take_batch(self) -> List[tuple]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while batch[-1] is not None and len(batch) < self.max_batch:
+            # a short window lets writes from concurrent sessions share one commit
+            try:
+                batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            stop = batch[-1] is None
+            jobs = [j for j in batch if j is not None]
+            if jobs:
+                self._commit(jobs)
+            if stop:
+                return
+
+    def _commit(self, jobs: List[tuple]):
+        results = []
+        try:
+            # immediate: reserve_slot's overlap check must hold the write lock, as in db.reserve_slot
+            with db.transaction(self.db_path, immediate=True) as conn:
+                for loop, fut, ctx, func, args, kwargs in jobs:
+                    conn.execute("SAVEPOINT adb_job")
+                    try:
+                        result, error = ctx.run(func, self.db_path, *args, **kwargs), None
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO adb_job")
+                        result, error = None, e
+                    conn.execute("RELEASE adb_job")
+                    results.append((result, error))
+        except Exception as e:
+            # the commit itself failed, so none of the batch was written
+            results = [(None, e)] * len(jobs)
+        self.batches += 1
+        self.jobs += len(jobs)
+        for (loop, fut, *_), (result, error) in zip(jobs, results):
+            try:
+                loop.call_soon_threadsafe(_resolve, fut, result, error)
+            except RuntimeError:
+                pass  # the submitting loop has closed; the write itself is committed
+
+_writers: Dict[str, WriteQueue] = {}
+_writers_lock = threading.Lock()
+
+def get_write_queue(db_path: str) -> WriteQueue:
+    with _writers_lock:
+        wq = _writers.get(db_path)
+        if wq is None:
+            wq = _writers[db_path] = WriteQueue(db_path, settings.ADB_WRITE_BATCH_SIZE, settings.ADB_WRITE_WINDOW_MS)
+        return wq
+
+async def run_write(db_path: str, func: Callable, *args, **kwargs):
+    """Queue func(db_path, ...) for the database's writer thread and wait for its batch to commit."""
+    return await get_write_queue(db_path).submit(func, *args, **kwargs)
+
+def close_writers():
+    """Drain queued writes and stop the writer threads."""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for wq in writers:
+        wq.close()
+
+atexit.register(close_writers)
+
+def _reader(func: Callable) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(db_path: str, *args, **kwargs):
+        return await run_read(func, db_path, *args, **kwargs)
+    return wrapper
+
+def _writer(func: Callable) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(db_path: str, *args, **kwargs):
+        return await run_write(db_path, func, *args, **kwargs)
+    return wrapper
+
+find_doctors = _reader(db.find_doctors)
+find_patient_names = _reader(db.find_patient_names)
+get_patient_records = _reader(db.get_patient_records)
+search_patient_records = _reader(db.search_patient_records)
+get_record_summaries = _reader(db.get_record_summaries)
+find_free_slots = _reader(db.find_free_slots)
+get_available_slots = _reader(db.get_available_slots)
+page_patients = _reader(db.page_patients)
+page_appointments = _reader(db.page_appointments)
+list_patients = _reader(db.list_patients)
+list_appointments = _reader(db.list_appointments)
+
+upsert_patient = _writer(db.upsert_patient)
+add_record = _writer(db.add_record)
+book_appointment = _writer(db.book_appointment)
+reserve_slot = _writer(db.reserve_slot)
+save_record_summaries = _writer(db.save_record_summaries)
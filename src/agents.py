@@ -1,46 +1,163 @@
 from typing import Dict, Any
-from src.db import find_doctors, get_available_slots, book_appointment, add_record, get_patient_records
-from src.tools import parse_date_hint, pick_time_window
+import json
+from config import settings
+from src import adb
+from src.db import find_doctors, get_available_slots, find_free_slots, reserve_slot, add_record, get_patient_records
+from src.db import search_patient_records, get_record_summaries, save_record_summaries
+from src.tools import parse_date_hint, pick_time_window, summarize_text, estimate_tokens
 
-def appointment_agent(db_path: str, extracted: Dict[str, Any]) -> Dict[str, Any]:
-    patient = extracted.get("patient_name") or "Patient"
-    specialty = extracted.get("specialty")
-    doctor_name = extracted.get("doctor")
-    date_hint = extracted.get("date_hint")
-    time_hint = extracted.get("time_hint")
-    reason = extracted.get("symptoms/topic") or extracted.get("topic") or "Consultation"
-
-    doctors = find_doctors(db_path, specialty=specialty) if specialty else find_doctors(db_path, specialty=None)
-    chosen = None
-    if doctor_name and doctors:
+ALTERNATIVE_DAYS = 7
+ALTERNATIVE_LIMIT = 3
+
+def _booking_request(extracted: Dict[str, Any]) -> Dict[str, Any]:
+    start_hour, end_hour = pick_time_window(extracted.get("time_hint"))
+    return {"patient": extracted.get("patient_name") or "Patient", "specialty": extracted.get("specialty"),
+            "doctor_name": extracted.get("doctor"), "day": parse_date_hint(extracted.get("date_hint")),
+            "start_hour": start_hour, "end_hour": end_hour,
+            "reason": extracted.get("symptoms/topic") or extracted.get("topic") or "Consultation"}
+
+def _choose_doctor(doctors, doctor_name: str):
+    if doctor_name:
         for d in doctors:
             if doctor_name.lower() in d["name"].lower():
-                chosen = d
-                break
-    if not chosen and doctors:
-        chosen = doctors[0]
+                return d
+    return doctors[0] if doctors else None
+
+def _alternatives_args(chosen: Dict[str, Any], doctors, req: Dict[str, Any]):
+    # look across the same-specialty doctors and the following days in one query
+    ids = [chosen["doctor_id"]] + [d["doctor_id"] for d in doctors if d["doctor_id"] != chosen["doctor_id"]]
+    return (ids, req["day"]), dict(days=ALTERNATIVE_DAYS, start_hour=req["start_hour"], end_hour=req["end_hour"],
+                                   slot_minutes=30, limit=ALTERNATIVE_LIMIT)
+
+def _booking_result(req: Dict[str, Any], chosen: Dict[str, Any], doctors, appt, free) -> Dict[str, Any]:
+    if not appt:
+        by_id = {d["doctor_id"]: d for d in doctors}
+        alternatives = [{"doctor": by_id[f["doctor_id"]], "start_time": f["start_time"], "end_time": f["end_time"]} for f in free]
+        return {"ok": False, "message": "No available slots found for that day/time window.", "doctor": chosen, "day": req["day"], "alternatives": alternatives}
+    return {"ok": True, "action": "book_appointment", "appointment": appt, "doctor": chosen, "day": req["day"]}
+
+_NO_DOCTORS = "No doctors found. Seed demo data first."
+
+def appointment_agent(db_path: str, extracted: Dict[str, Any]) -> Dict[str, Any]:
+    req = _booking_request(extracted)
+    doctors = find_doctors(db_path, specialty=req["specialty"] or None)
+    chosen = _choose_doctor(doctors, req["doctor_name"])
     if not chosen:
-        return {"ok": False, "message": "No doctors found. Seed demo data first.", "patient": patient}
+        return {"ok": False, "message": _NO_DOCTORS, "patient": req["patient"]}
 
-    day_iso = parse_date_hint(date_hint)
-    start_hour, end_hour = pick_time_window(time_hint)
-    slots = get_available_slots(db_path, chosen["doctor_id"], day_iso, start_hour=start_hour, end_hour=end_hour, slot_minutes=30)
+    slots = get_available_slots(db_path, chosen["doctor_id"], req["day"], start_hour=req["start_hour"], end_hour=req["end_hour"], slot_minutes=30)
+    appt, free = None, []
+    if slots:
+        s = slots[0]
+        appt = reserve_slot(db_path, req["patient"], chosen["doctor_id"], s["start_time"], s["end_time"], reason=req["reason"],
+                            start_hour=req["start_hour"], end_hour=req["end_hour"])
+    if not appt:
+        args, kwargs = _alternatives_args(chosen, doctors, req)
+        free = find_free_slots(db_path, *args, **kwargs)
+    return _booking_result(req, chosen, doctors, appt, free)
 
-    if not slots:
-        return {"ok": False, "message": "No available slots found for that day/time window.", "doctor": chosen, "day": day_iso}
+async def aappointment_agent(db_path: str, extracted: Dict[str, Any]) -> Dict[str, Any]:
+    req = _booking_request(extracted)
+    doctors = await adb.find_doctors(db_path, specialty=req["specialty"] or None)
+    chosen = _choose_doctor(doctors, req["doctor_name"])
+    if not chosen:
+        return {"ok": False, "message": _NO_DOCTORS, "patient": req["patient"]}
 
-    s = slots[0]
-    appt = book_appointment(db_path, patient, chosen["doctor_id"], s["start_time"], s["end_time"], reason=reason)
-    return {"ok": True, "action": "book_appointment", "appointment": appt, "doctor": chosen, "day": day_iso}
+    slots = await adb.get_available_slots(db_path, chosen["doctor_id"], req["day"], start_hour=req["start_hour"], end_hour=req["end_hour"], slot_minutes=30)
+    appt, free = None, []
+    if slots:
+        s = slots[0]
+        appt = await adb.reserve_slot(db_path, req["patient"], chosen["doctor_id"], s["start_time"], s["end_time"], reason=req["reason"],
+                                      start_hour=req["start_hour"], end_hour=req["end_hour"])
+    if not appt:
+        args, kwargs = _alternatives_args(chosen, doctors, req)
+        free = await adb.find_free_slots(db_path, *args, **kwargs)
+    return _booking_result(req, chosen, doctors, appt, free)
 
 def records_agent(db_path: str, extracted: Dict[str, Any], user_message: str) -> Dict[str, Any]:
     patient = extracted.get("patient_name") or "Patient"
     rec = add_record(db_path, patient, "Note", user_message, source="chat_update")
     return {"ok": True, "action": "update_records", "record": rec}
 
-def history_agent(db_path: str, extracted: Dict[str, Any]) -> Dict[str, Any]:
+async def arecords_agent(db_path: str, extracted: Dict[str, Any], user_message: str) -> Dict[str, Any]:
+    patient = extracted.get("patient_name") or "Patient"
+    rec = await adb.add_record(db_path, patient, "Note", user_message, source="chat_update")
+    return {"ok": True, "action": "update_records", "record": rec}
+
+HISTORY_RECORD_LIMIT = 25
+HISTORY_MATCH_LIMIT = 10
+# words that describe the request itself rather than what to look for in the records
+_HISTORY_NOISE = {"show", "history", "medical", "records", "record", "patient", "please", "get", "retrieve", "view", "past",
+                  "previous", "me", "all", "list", "give", "see", "visits"}
+
+def _history_terms(user_message: str, patient: str) -> str:
+    skip = _HISTORY_NOISE | {w.lower() for w in patient.split()}
+    return " ".join(w for w in (user_message or "").replace("?", " ").split() if w.lower().strip(",.:;'") not in skip)
+
+def _history_question(extracted: Dict[str, Any], user_message: str, patient: str) -> str:
+    return " ".join(filter(None, [extracted.get("symptoms/topic") or extracted.get("topic"), _history_terms(user_message, patient)]))
+
+def _long_record_ids(records):
+    return [r["record_id"] for r in records if len(r["content"] or "") > settings.RECORD_SUMMARY_CHARS]
+
+def _summarize_missing(records, long_ids, summaries: Dict[int, str]) -> Dict[int, tuple]:
+    # long records go in as cached extractive summaries; short ones verbatim
+    fresh = {}
+    for r in records:
+        if r["record_id"] in long_ids and r["record_id"] not in summaries:
+            summaries[r["record_id"]] = summarize_text(r["content"], max_chars=settings.RECORD_SUMMARY_CHARS)
+            fresh[r["record_id"]] = (summaries[r["record_id"]], len(r["content"]))
+    return fresh
+
+def _history_result(patient: str, matches, ordered, summaries: Dict[int, str]) -> Dict[str, Any]:
+    # token budget: most relevant first, then most recent, until the budget is spent
+    records, used = [], 0
+    for r in ordered:
+        item = {k: r[k] for k in ("created_at", "record_type", "source")}
+        item["content"] = summaries.get(r["record_id"], r["content"])
+        if r["record_id"] in summaries:
+            item["summarized"] = True
+        if "score" in r:
+            item["relevance"] = r["score"]
+        cost = estimate_tokens(json.dumps(item))
+        if records and used + cost > settings.HISTORY_TOKEN_BUDGET:
+            break
+        records.append(item)
+        used += cost
+    return {"ok": True, "action": "retrieve_history", "patient": patient, "records": records,
+            "matched": len(matches), "omitted": len(ordered) - len(records), "record_tokens": used}
+
+def _merge_history(matches, recent):
+    seen = {r["record_id"] for r in matches}
+    return matches + [r for r in recent if r["record_id"] not in seen]
+
+def _no_history(patient: str) -> Dict[str, Any]:
+    return {"ok": False, "action": "retrieve_history", "patient": patient, "message": "No records found for this patient."}
+
+def history_agent(db_path: str, extracted: Dict[str, Any], user_message: str="") -> Dict[str, Any]:
+    patient = extracted.get("patient_name") or "Patient"
+    question = _history_question(extracted, user_message, patient)
+    matches = search_patient_records(db_path, patient, question, limit=HISTORY_MATCH_LIMIT) if question else []
+    recent = get_patient_records(db_path, patient, limit=HISTORY_RECORD_LIMIT)
+    if not matches and not recent:
+        return _no_history(patient)
+    ordered = _merge_history(matches, recent)
+    long_ids = _long_record_ids(ordered)
+    summaries = get_record_summaries(db_path, long_ids)
+    save_record_summaries(db_path, _summarize_missing(ordered, long_ids, summaries))
+    return _history_result(patient, matches, ordered, summaries)
+
+async def ahistory_agent(db_path: str, extracted: Dict[str, Any], user_message: str="") -> Dict[str, Any]:
     patient = extracted.get("patient_name") or "Patient"
-    records = get_patient_records(db_path, patient, limit=25)
-    if not records:
-        return {"ok": False, "action": "retrieve_history", "patient": patient, "message": "No records found for this patient."}
-    return {"ok": True, "action": "retrieve_history", "patient": patient, "records": records}
+    question = _history_question(extracted, user_message, patient)
+    matches = await adb.search_patient_records(db_path, patient, question, limit=HISTORY_MATCH_LIMIT) if question else []
+    recent = await adb.get_patient_records(db_path, patient, limit=HISTORY_RECORD_LIMIT)
+    if not matches and not recent:
+        return _no_history(patient)
+    ordered = _merge_history(matches, recent)
+    long_ids = _long_record_ids(ordered)
+    summaries = await adb.get_record_summaries(db_path, long_ids)
+    fresh = _summarize_missing(ordered, long_ids, summaries)
+    if fresh:
+        await adb.save_record_summaries(db_path, fresh)
+    return _history_result(patient, matches, ordered, summaries)
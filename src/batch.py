@@ -0,0 +1,154 @@
+"""Bulk processing of chat messages through the orchestrator graph.
+
+Usage:
+    python -m src.batch --input day.jsonl --output results.jsonl --provider groq --concurrency 4
+    cat day.jsonl | python -m src.batch --input - --output -
+
+Each input line is a JSON object with the message under "message", "body" or "text"
+and an optional "id"/"request_id"; bare strings are accepted too. Output lines carry
+the id, intent, sentiment, action, final response and per-message timing.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from langchain_core.runnables import RunnableLambda
+
+from config import settings
+from src.db import init_db
+from src.kb import load_kb
+from src.orchestrator import build_graph, initial_state
+
+RESULT_KEYS = ("intent", "sentiment", "action", "final_response", "retrieval_timings", "context_stats", "trace")
+
+def _timed(graph):
+    # wraps the compiled graph so .batch/.abatch report wall time and errors per message
+    def _run(state):
+        t0 = time.perf_counter()
+        try:
+            out = graph.invoke(state)
+            return {"result": out, "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1)}
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}", "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+    async def _arun(state):
+        t0 = time.perf_counter()
+        try:
+            out = await graph.ainvoke(state)
+            return {"result": out, "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1)}
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}", "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+    return RunnableLambda(_run, afunc=_arun)
+
+def _warm_shared_resources(db_path: str, faiss_dir: str, embedding_model: str):
+    # one schema check and one KB load up front; workers then share the registry and connection pool
+    init_db(db_path)
+    try:
+        load_kb(faiss_dir, embedding_model)
+    except Exception:
+        pass  # KB not built; medical_info messages will report it per message
+
+def run_graph_batch(graph, messages: List[str], db_path: str, faiss_dir: str, embedding_model: str, max_concurrency: int=4) -> List[Dict[str, Any]]:
+    _warm_shared_resources(db_path, faiss_dir, embedding_model)
+    states = [initial_state(m, db_path, faiss_dir, embedding_model) for m in messages]
+    return _timed(graph).batch(states, config={"max_concurrency": max_concurrency})
+
+async def arun_graph_batch(graph, messages: List[str], db_path: str, faiss_dir: str, embedding_model: str, max_concurrency: int=4) -> List[Dict[str, Any]]:
+    await asyncio.to_thread(_warm_shared_resources, db_path, faiss_dir, embedding_model)
+    states = [initial_state(m, db_path, faiss_dir, embedding_model) for m in messages]
+    return await _timed(graph).abatch(states, config={"max_concurrency": max_concurrency})
+
+def _parse_line(line: str, lineno: int) -> Optional[Dict[str, Any]]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        obj = line
+    if isinstance(obj, str):
+        return {"id": lineno, "message": obj}
+    message = obj.get("message") or obj.get("body") or obj.get("text") or ""
+    return {"id": obj.get("id", obj.get("request_id", lineno)), "message": message}
+
+def read_jsonl(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    for lineno, line in enumerate(lines, start=1):
+        item = _parse_line(line, lineno)
+        if item is not None:
+            yield item
+
+def _output_row(item: Dict[str, Any], res: Dict[str, Any]) -> Dict[str, Any]:
+    row = {"id": item["id"], "message": item["message"], "elapsed_ms": res["elapsed_ms"]}
+    if "error" in res:
+        row["error"] = res["error"]
+    else:
+        row.update({k: res["result"].get(k) for k in RESULT_KEYS if k in res["result"]})
+    return row
+
+def process_stream(graph, items: Iterable[Dict[str, Any]], out, db_path: str, faiss_dir: str, embedding_model: str,
+                   max_concurrency: int=4, chunk_size: int=64, use_async: bool=False) -> Dict[str, Any]:
+    """Run items through the graph in bounded chunks, writing one JSONL result per message."""
+    it = iter(items)
+    total, errors, t0 = 0, 0, time.perf_counter()
+    latencies: List[float] = []
+    while True:
+        chunk = list(islice(it, chunk_size))
+        if not chunk:
+            break
+        messages = [c["message"] for c in chunk]
+        if use_async:
+            results = asyncio.run(arun_graph_batch(graph, messages, db_path, faiss_dir, embedding_model, max_concurrency))
+        else:
+            results = run_graph_batch(graph, messages, db_path, faiss_dir, embedding_model, max_concurrency)
+        for item, res in zip(chunk, results):
+            row = _output_row(item, res)
+            errors += "error" in row
+            latencies.append(row["elapsed_ms"])
+            out.write(json.dumps(row, default=str) + "\n")
+        out.flush()
+        total += len(chunk)
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "messages": total,
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "messages_per_second": round(total / elapsed, 2) if elapsed else 0.0,
+        "latency_ms_p50": latencies[len(latencies) // 2] if latencies else 0.0,
+        "latency_ms_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0,
+    }
+
+def main(argv: List[str]=None):
+    ap = argparse.ArgumentParser(description="Replay JSONL chat messages through the healthcare assistant graph.")
+    ap.add_argument("--input", required=True, help="JSONL file, or - for stdin")
+    ap.add_argument("--output", default="-", help="JSONL file, or - for stdout")
+    ap.add_argument("--provider", default=settings.LLM_PROVIDER)
+    ap.add_argument("--classifier", default=settings.CLASSIFIER_MODE)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--chunk-size", type=int, default=64)
+    ap.add_argument("--async", dest="use_async", action="store_true", help="use graph.abatch instead of a thread pool")
+    ap.add_argument("--db-path", default=settings.DB_PATH)
+    ap.add_argument("--faiss-dir", default=settings.FAISS_DIR)
+    ap.add_argument("--embedding-model", default=settings.EMBEDDING_MODEL)
+    args = ap.parse_args(argv)
+
+    graph = build_graph(args.provider, classifier=args.classifier, rate_limited=True)
+    src = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        summary = process_stream(graph, read_jsonl(src), dst, args.db_path, args.faiss_dir, args.embedding_model,
+                                 max_concurrency=args.concurrency, chunk_size=args.chunk_size, use_async=args.use_async)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    print(json.dumps(summary), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+BM25_FILE = "bm25.json"
+
+# keeps drug names, hyphenated terms and ICD-style codes (e11.9, i10) as single tokens
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+class BM25Index:
+    """Okapi BM25 over an inverted index, persisted as JSON next to the FAISS index."""
+
+    def __init__(self, k1: float=1.5, b: float=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids: List[str] = []
+        self.doc_len: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.avgdl = 0.0
+
+    @classmethod
+    def build(cls, docs: Iterable[Tuple[str, str]], k1: float=1.5, b: float=0.75) -> "BM25Index":
+        idx = cls(k1, b)
+        for doc_id, text in docs:
+            pos = len(idx.doc_ids)
+            tf = Counter(tokenize(text))
+            idx.doc_ids.append(doc_id)
+            idx.doc_len.append(sum(tf.values()))
+            for term, n in tf.items():
+                idx.postings.setdefault(term, []).append((pos, n))
+        idx.avgdl = (sum(idx.doc_len) / len(idx.doc_len)) if idx.doc_len else 0.0
+        return idx
+
+    def search(self, query: str, k: int=10) -> List[Tuple[str, float]]:
+        n_docs = len(self.doc_ids)
+        if not n_docs:
+            return []
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            for pos, tf in plist:
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_len[pos] / (self.avgdl or 1.0))
+                scores[pos] = scores.get(pos, 0.0) + idf * tf * (self.k1 + 1) / norm
+        top = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+        return [(self.doc_ids[pos], score) for pos, score in top]
+
+    def save(self, directory: str):
+        path = Path(directory) / BM25_FILE
+        tmp = path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "doc_ids": self.doc_ids, "doc_len": self.doc_len,
+                       "postings": self.postings}, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, directory: str) -> "BM25Index":
+        with open(Path(directory) / BM25_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        idx = cls(data["k1"], data["b"])
+        idx.doc_ids = data["doc_ids"]
+        idx.doc_len = data["doc_len"]
+        idx.postings = {t: [tuple(p) for p in plist] for t, plist in data["postings"].items()}
+        idx.avgdl = (sum(idx.doc_len) / len(idx.doc_len)) if idx.doc_len else 0.0
+        return idx
@@ -0,0 +1,155 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, List
+
+import numpy as np
+
+from config import settings
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS response_cache (
+  cache_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  query TEXT,
+  embedding BLOB,
+  response TEXT,
+  kb_version TEXT,
+  created_at REAL,
+  last_hit REAL,
+  hits INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_response_cache_last_hit ON response_cache(last_hit);
+"""
+
+def response_cache_path(db_path: str) -> str:
+    return str(Path(db_path).with_name("response_cache.db"))
+
+def _normalize(vec) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32)
+    n = float(np.linalg.norm(v))
+    return v / n if n else v
+
+class SemanticCache:
+    """Response cache keyed by query embedding, for medical_info answers only.
+
+    Entries are scoped to a KB version so a rebuilt index never serves stale answers;
+    lookups hit when cosine similarity >= threshold and the entry is within its TTL.
+    """
+
+    def __init__(self, path: str, threshold: float=0.92, ttl_seconds: int=86400, max_entries: int=1000):
+        self.path = path
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(CACHE_SCHEMA)
+        self._conn.commit()
+        self._ids: List[int] = []
+        self._responses: List[str] = []
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._version: Optional[str] = None
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    def _load(self, kb_version: str):
+        cutoff = time.time() - self.ttl_seconds
+        self._conn.execute("DELETE FROM response_cache WHERE kb_version<>? OR created_at<?", (kb_version, cutoff))
+        self._conn.commit()
+        rows = self._conn.execute("SELECT cache_id, embedding, response FROM response_cache ORDER BY cache_id").fetchall()
+        self._ids = [r[0] for r in rows]
+        self._responses = [r[2] for r in rows]
+        self._matrix = np.vstack([np.frombuffer(r[1], dtype=np.float32) for r in rows]) if rows else np.zeros((0, 0), dtype=np.float32)
+        self._version = kb_version
+
+    def _ensure_version(self, kb_version: str):
+        if self._version != kb_version:
+            if self._version is not None:
+                self.counters["invalidations"] += 1
+            self._load(kb_version)
+
+    def _drop(self, positions: List[int]):
+        if not positions:
+            return
+        ids = [self._ids[i] for i in positions]
+        self._conn.executemany("DELETE FROM response_cache WHERE cache_id=?", [(i,) for i in ids])
+        self._conn.commit()
+        dropped = set(positions)
+        keep = [i for i in range(len(self._ids)) if i not in dropped]
+        self._ids = [self._ids[i] for i in keep]
+        self._responses = [self._responses[i] for i in keep]
+        self._matrix = self._matrix[keep] if keep else np.zeros((0, 0), dtype=np.float32)
+
+    def lookup(self, embedding, kb_version: str) -> Optional[str]:
+        q = _normalize(embedding)
+        with self._lock:
+            self._ensure_version(kb_version)
+            if not self._ids or self._matrix.shape[1] != q.shape[0]:
+                self.counters["misses"] += 1
+                return None
+            sims = self._matrix @ q
+            best = int(np.argmax(sims))
+            if float(sims[best]) < self.threshold:
+                self.counters["misses"] += 1
+                return None
+            cache_id = self._ids[best]
+            row = self._conn.execute("SELECT created_at FROM response_cache WHERE cache_id=?", (cache_id,)).fetchone()
+            if not row or row[0] < time.time() - self.ttl_seconds:
+                self._drop([best])
+                self.counters["misses"] += 1
+                return None
+            self._conn.execute("UPDATE response_cache SET last_hit=?, hits=hits+1 WHERE cache_id=?", (time.time(), cache_id))
+            self._conn.commit()
+            self.counters["hits"] += 1
+            return self._responses[best]
+
+    def store(self, query: str, embedding, response: str, kb_version: str):
+        v = _normalize(embedding)
+        now = time.time()
+        with self._lock:
+            self._ensure_version(kb_version)
+            cur = self._conn.execute(
+                "INSERT INTO response_cache(query, embedding, response, kb_version, created_at, last_hit, hits) VALUES (?,?,?,?,?,?,0)",
+                (query, v.tobytes(), response, kb_version, now, now)
+            )
+            self._conn.commit()
+            self._ids.append(int(cur.lastrowid))
+            self._responses.append(response)
+            self._matrix = np.vstack([self._matrix, v]) if self._matrix.size else v.reshape(1, -1)
+            self.counters["stores"] += 1
+            overflow = len(self._ids) - self.max_entries
+            if overflow > 0:
+                rows = self._conn.execute("SELECT cache_id FROM response_cache ORDER BY last_hit ASC LIMIT ?", (overflow,)).fetchall()
+                evict = {r[0] for r in rows}
+                self._drop([i for i, cid in enumerate(self._ids) if cid in evict])
+                self.counters["evictions"] += len(evict)
+
+    def invalidate(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self._conn.commit()
+            self._ids, self._responses = [], []
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+            self.counters["invalidations"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters, entries=len(self._ids))
+
+_CACHES: Dict[str, SemanticCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+def get_response_cache(db_path: str) -> SemanticCache:
+    path = response_cache_path(db_path)
+    with _CACHES_LOCK:
+        cache = _CACHES.get(path)
+        if cache is None:
+            cache = SemanticCache(
+                path,
+                threshold=settings.RESPONSE_CACHE_THRESHOLD,
+                ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+                max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            )
+            _CACHES[path] = cache
+        return cache
@@ -0,0 +1,156 @@
+"""Context assembly for the response prompt.
+
+Runs between the action/retrieve nodes and respond. It serializes intent, sentiment
+and action output compactly and drops retrieved chunks that repeat earlier ones. It
+then trims the prompt to the provider's token budget: lowest-ranked retrieved chunks
+go first, then the least relevant history records. The stats returned with the prompt
+sections report how many tokens this saved over the unbounded indent=2 prompt.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+from config import settings
+from src.tools import RESPONSE_PROMPT, compact_json, estimate_tokens
+
+# --- token counting -------------------------------------------------------------
+
+_counters: Dict[str, Callable[[str], int]] = {}
+_counters_lock = threading.Lock()
+
+_TIKTOKEN_URL = "https://openaipublic.blob.core.windows.net/encodings/{}.tiktoken"
+
+def _cached_encoding(encoding: str) -> bool:
+    # tiktoken downloads a missing encoding (no timeout), so only ask for one already in its cache dir
+    cache_dir = os.environ.get("TIKTOKEN_CACHE_DIR") or os.environ.get("DATA_GYM_CACHE_DIR")
+    key = hashlib.sha1(_TIKTOKEN_URL.format(encoding).encode()).hexdigest()
+    return bool(cache_dir) and os.path.isfile(os.path.join(cache_dir, key))
+
+def _load_counter(encoding: str) -> Tuple[str, Callable[[str], int]]:
+    # budgets are approximate: the chars/4 estimate unless a locally cached tiktoken encoding is configured
+    if encoding and _cached_encoding(encoding):
+        try:
+            import tiktoken
+            enc = tiktoken.get_encoding(encoding)
+            return f"tiktoken:{encoding}", lambda text: len(enc.encode(text or "", disallowed_special=()))
+        except Exception:
+            pass
+    return "estimate", estimate_tokens
+
+def token_counter(encoding: str=None) -> Tuple[str, Callable[[str], int]]:
+    encoding = settings.PROMPT_TOKENIZER if encoding is None else encoding
+    with _counters_lock:
+        if encoding not in _counters:
+            _counters[encoding] = _load_counter(encoding)
+        return _counters[encoding]
+
+def token_budget(provider: str) -> int:
+    """Per-provider prompt budget (PROMPT_TOKEN_BUDGET_<PROVIDER>), else PROMPT_TOKEN_BUDGET."""
+    return int(getattr(settings, f"PROMPT_TOKEN_BUDGET_{(provider or '').upper()}", settings.PROMPT_TOKEN_BUDGET))
+
+def prompt_tokens(sections: Dict[str, str], message: str, count: Callable[[str], int]) -> int:
+    return sum(count(m.content) for m in RESPONSE_PROMPT.format_messages(message=message, **sections))
+
+# --- retrieved chunk deduplication ------------------------------------------------
+
+_CHUNK_SPLIT_RE = re.compile(r"\n\n(?=\[\d+\] )")
+_LABEL_RE = re.compile(r"^\[\d+\] ")
+_SHINGLE = 5
+
+def split_chunks(context: str) -> List[str]:
+    """Split build_context output back into its "[n] ..." chunks; placeholders stay whole."""
+    if not context or not _LABEL_RE.match(context):
+        return [context] if context else []
+    return _CHUNK_SPLIT_RE.split(context)
+
+def _words(chunk: str) -> List[str]:
+    return _LABEL_RE.sub("", chunk).lower().split()
+
+def _shingles(words: List[str]) -> set:
+    if len(words) < _SHINGLE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + _SHINGLE]) for i in range(len(words) - _SHINGLE + 1)}
+
+def _overlap_prefix(prev: List[str], words: List[str], min_words: int=8) -> int:
+    # text splitters repeat the tail of one chunk at the head of the next
+    for n in range(min(len(prev), len(words)), min_words - 1, -1):
+        if prev[-n:] == words[:n]:
+            return n
+    return 0
+
+def dedupe_chunks(chunks: List[str], threshold: float=None) -> Tuple[List[str], int]:
+    """Drop chunks mostly contained in earlier ones and strip splitter overlap; returns (chunks, dropped)."""
+    threshold = settings.CONTEXT_DEDUP_THRESHOLD if threshold is None else threshold
+    kept, seen, dropped = [], set(), 0
+    prev_words: List[str] = []
+    for chunk in chunks:
+        words = _words(chunk)
+        shingles = _shingles(words)
+        if shingles and len(shingles & seen) / len(shingles) >= threshold:
+            dropped += 1
+            continue
+        cut = _overlap_prefix(prev_words, words)
+        if cut:
+            label = _LABEL_RE.match(chunk)
+            body = _LABEL_RE.sub("", chunk).split()
+            chunk = (label.group(0) if label else "") + "... " + " ".join(body[cut:])
+        kept.append(chunk)
+        seen |= shingles
+        prev_words = words
+    return kept, dropped
+
+# --- assembly -------------------------------------------------------------------
+
+def _baseline_sections(intent, sentiment, action, context: str) -> Dict[str, str]:
+    # what craft_final_response used to send: pretty-printed objects, untrimmed context
+    return {"intent": json.dumps(intent, indent=2), "sentiment": json.dumps(sentiment, indent=2),
+            "action": json.dumps(action, indent=2, default=str), "context": context}
+
+def assemble_context(message: str, intent: Dict[str, Any], sentiment: Dict[str, Any], action: Dict[str, Any],
+                     context: str, provider: str=None, budget: int=None) -> Dict[str, Any]:
+    """Build the response prompt sections within the token budget.
+
+    Returns {"sections": {intent, sentiment, action, context} as prompt-ready strings,
+    "stats": {...}} where stats["tokens_saved"] is baseline minus final prompt tokens.
+    """
+    tokenizer, count = token_counter()
+    budget = token_budget(provider) if budget is None else budget
+    baseline = prompt_tokens(_baseline_sections(intent, sentiment, action, context), message, count)
+
+    raw_chunks = split_chunks(context)
+    chunks, duplicates = dedupe_chunks(raw_chunks)
+    action = dict(action or {})
+    records = list(action.get("records") or [])
+    sections = {"intent": compact_json(intent), "sentiment": compact_json(sentiment)}
+    chunks_dropped = records_dropped = 0
+
+    def fit() -> int:
+        if "records" in action:
+            action["records"] = records
+        sections["action"] = compact_json(action)
+        sections["context"] = "\n\n".join(chunks) if chunks or not raw_chunks else "(trimmed to fit the prompt budget)"
+        return prompt_tokens(sections, message, count)
+
+    used = fit()
+    # cheapest loss first: the lowest-ranked retrieved chunks, then the least relevant history records
+    while used > budget and len(chunks) > 1:
+        chunks.pop()
+        chunks_dropped += 1
+        used = fit()
+    while used > budget and len(records) > 1:
+        records.pop()
+        records_dropped += 1
+        action["omitted"] = action.get("omitted", 0) + 1
+        used = fit()
+    while used > budget and chunks:
+        chunks.pop()
+        chunks_dropped += 1
+        used = fit()
+
+    stats = {"tokenizer": tokenizer, "budget": budget, "baseline_tokens": baseline, "prompt_tokens": used,
+             "tokens_saved": baseline - used, "duplicate_chunks": duplicates, "chunks_dropped": chunks_dropped,
+             "records_dropped": records_dropped, "over_budget": used > budget}
+    return {"sections": sections, "stats": stats}
@@ -1,9 +1,15 @@
+import heapq
 import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 from pathlib import Path
 import re
 
+from src.tracing import traced_db
+
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS patients (
   patient_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -44,79 +50,386 @@ CREATE TABLE IF NOT EXISTS appointments (
 );
 """
 
-def init_db(db_path: str):
-    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-    with sqlite3.connect(db_path) as conn:
-        conn.executescript(SCHEMA)
+# Audit trail for appointments a migration changed: the 'Conflict' status means "double-booked
+# before the overlap constraint existed"; the dashboard lists these for staff to resolve.
+APPOINTMENT_CONFLICTS_TABLE = (
+    "CREATE TABLE IF NOT EXISTS appointment_conflicts (appointment_id INTEGER PRIMARY KEY, kept_appointment_id INTEGER, "
+    "doctor_id INTEGER, start_time TEXT, previous_status TEXT, flagged_at TEXT, reason TEXT)"
+)
+
+# Versioned migrations applied by init_db on top of SCHEMA; the applied version is
+# tracked in PRAGMA user_version. Append new versions, never edit shipped ones.
+MIGRATIONS = [
+    (1, [
+        "CREATE INDEX IF NOT EXISTS idx_patient_records_patient_created ON patient_records(patient_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_doctor_start ON appointments(doctor_id, start_time)",
+        "CREATE INDEX IF NOT EXISTS idx_doctors_specialty_lower ON doctors(lower(specialty))",
+    ]),
+    (2, [
+        # keep the earliest of any pre-existing double bookings, flag the rest
+        "UPDATE appointments SET status='Conflict' WHERE status='Booked' AND appointment_id NOT IN "
+        "(SELECT MIN(appointment_id) FROM appointments WHERE status='Booked' GROUP BY doctor_id, start_time)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_appointments_doctor_start_booked ON appointments(doctor_id, start_time) WHERE status='Booked'",
+        "CREATE TRIGGER IF NOT EXISTS trg_appointments_no_overlap BEFORE INSERT ON appointments "
+        "WHEN NEW.status='Booked' AND EXISTS (SELECT 1 FROM appointments WHERE doctor_id=NEW.doctor_id AND status='Booked' "
+        "AND start_time<NEW.end_time AND end_time>NEW.start_time) "
+        "BEGIN SELECT RAISE(ABORT, 'appointment overlaps an existing booking'); END",
+    ]),
+    (3, [
+        # same check, but bounded to bookings starting at most a day earlier so the
+        # (doctor_id, start_time) index range stays small instead of scanning the doctor's history
+        "DROP TRIGGER IF EXISTS trg_appointments_no_overlap",
+        "CREATE TRIGGER trg_appointments_no_overlap BEFORE INSERT ON appointments "
+        "WHEN NEW.status='Booked' AND EXISTS (SELECT 1 FROM appointments WHERE doctor_id=NEW.doctor_id AND status='Booked' "
+        "AND start_time>=strftime('%Y-%m-%dT%H:%M:%S', NEW.start_time, '-1 day') "
+        "AND start_time<NEW.end_time AND end_time>NEW.start_time) "
+        "BEGIN SELECT RAISE(ABORT, 'appointment overlaps an existing booking'); END",
+    ]),
+    (4, [
+        # keyset pagination / dashboard filters; the rowid (appointment_id, patient_id) is the implicit tie-breaker
+        "CREATE INDEX IF NOT EXISTS idx_patients_name_nocase ON patients(name COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_start ON appointments(start_time)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_status_start ON appointments(status, start_time)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_patient_start ON appointments(patient_id, start_time)",
+    ]),
+    (5, [
+        # external-content FTS5 index over record text; patient_id is indexed as a token so a
+        # per-patient search intersects two posting lists instead of filtering every match
+        "CREATE VIRTUAL TABLE IF NOT EXISTS patient_records_fts USING fts5("
+        "content, patient_id, content='patient_records', content_rowid='record_id', tokenize='porter unicode61')",
+        "CREATE TABLE IF NOT EXISTS record_summaries (record_id INTEGER PRIMARY KEY, summary TEXT, content_chars INTEGER, created_at TEXT)",
+        "CREATE TRIGGER IF NOT EXISTS trg_patient_records_fts_ai AFTER INSERT ON patient_records BEGIN "
+        "INSERT INTO patient_records_fts(rowid, content, patient_id) VALUES (NEW.record_id, NEW.content, NEW.patient_id); END",
+        "CREATE TRIGGER IF NOT EXISTS trg_patient_records_fts_ad AFTER DELETE ON patient_records BEGIN "
+        "INSERT INTO patient_records_fts(patient_records_fts, rowid, content, patient_id) VALUES ('delete', OLD.record_id, OLD.content, OLD.patient_id); "
+        "DELETE FROM record_summaries WHERE record_id=OLD.record_id; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_patient_records_fts_au AFTER UPDATE OF content, patient_id ON patient_records BEGIN "
+        "INSERT INTO patient_records_fts(patient_records_fts, rowid, content, patient_id) VALUES ('delete', OLD.record_id, OLD.content, OLD.patient_id); "
+        "INSERT INTO patient_records_fts(rowid, content, patient_id) VALUES (NEW.record_id, NEW.content, NEW.patient_id); "
+        "DELETE FROM record_summaries WHERE record_id=OLD.record_id; END",
+        "INSERT INTO patient_records_fts(patient_records_fts) VALUES ('rebuild')",
+    ]),
+    (6, [
+        # audit trail for migration 2, which flagged bookings sharing a doctor and exact start time:
+        # 'Conflict' is only ever set by a migration, so the flagged rows are recovered from their status
+        APPOINTMENT_CONFLICTS_TABLE,
+        "INSERT OR IGNORE INTO appointment_conflicts(appointment_id, kept_appointment_id, doctor_id, start_time, previous_status, flagged_at, reason) "
+        "SELECT a.appointment_id, (SELECT MIN(k.appointment_id) FROM appointments k WHERE k.status='Booked' AND k.doctor_id=a.doctor_id AND k.start_time=a.start_time), "
+        "a.doctor_id, a.start_time, 'Booked', NULL, 'double booking found by migration 2' FROM appointments a WHERE a.status='Conflict'",
+    ]),
+    (7, [
+        # migration 2 missed partial overlaps (9:00-10:00 vs 9:30-10:30): audit, then flag, every booking that
+        # overlaps an earlier-created one for the same doctor; the lookback is bounded like the trigger's
+        "INSERT OR IGNORE INTO appointment_conflicts(appointment_id, kept_appointment_id, doctor_id, start_time, previous_status, flagged_at, reason) "
+        "SELECT a.appointment_id, MIN(k.appointment_id), a.doctor_id, a.start_time, 'Booked', strftime('%Y-%m-%dT%H:%M:%S','now'), "
+        "'overlapping booking found by migration 7' FROM appointments a JOIN appointments k ON k.doctor_id=a.doctor_id "
+        "AND k.status='Booked' AND k.appointment_id<a.appointment_id AND k.start_time>=strftime('%Y-%m-%dT%H:%M:%S', a.start_time, '-1 day') "
+        "AND k.start_time<a.end_time AND k.end_time>a.start_time "
+        "WHERE a.status='Booked' GROUP BY a.appointment_id",
+        "UPDATE appointments SET status='Conflict' WHERE status='Booked' AND appointment_id IN "
+        "(SELECT appointment_id FROM appointment_conflicts WHERE reason='overlapping booking found by migration 7')",
+    ]),
+]
+
+SQL_PATIENT_RECORDS = "SELECT record_id, created_at, record_type, content, source FROM patient_records WHERE patient_id=? ORDER BY created_at DESC LIMIT ?"
+SQL_SEARCH_PATIENT_RECORDS = (
+    "SELECT r.record_id, r.created_at, r.record_type, r.content, r.source, patient_records_fts.rank "
+    "FROM patient_records_fts JOIN patient_records r ON r.record_id=patient_records_fts.rowid "
+    "WHERE patient_records_fts MATCH ? ORDER BY patient_records_fts.rank LIMIT ?"
+)
+SQL_DOCTORS_BY_SPECIALTY = "SELECT doctor_id, name, specialty FROM doctors WHERE lower(specialty)=lower(?)"
+SQL_BOOKED_INTERVALS = "SELECT doctor_id, start_time, end_time FROM appointments WHERE doctor_id IN ({doctors}) AND start_time>=? AND start_time<? AND status='Booked'"
+SQL_OVERLAPPING_BOOKING = "SELECT 1 FROM appointments WHERE doctor_id=? AND status='Booked' AND start_time>=? AND start_time<? AND end_time>? LIMIT 1"
+
+# appointments never span more than this, which bounds how far back overlap checks look
+MAX_APPOINTMENT = timedelta(days=1)
+
+BUSY_TIMEOUT_MS = 5000
+
+PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+)
+
+_local = threading.local()
+_all_conns: List[tuple] = []  # (owning thread, connection)
+_all_conns_lock = threading.Lock()
+
+# bumped whenever a transaction commits changes; read-side caches key on it
+_write_generations: Dict[str, int] = {}
+_write_generations_lock = threading.Lock()
+
+def write_generation(db_path: str) -> int:
+    return _write_generations.get(db_path, 0)
+
+def _bump_write_generation(db_path: str):
+    with _write_generations_lock:
+        _write_generations[db_path] = _write_generations.get(db_path, 0) + 1
+
+def _close_quietly(conns):
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+class _ThreadConns(dict):
+    """One thread's (db_path, readonly) -> connection map; its connections close when the thread exits."""
+
+    def __init__(self):
+        super().__init__()
+        self.owned: List[sqlite3.Connection] = []
+        # thread-local storage is dropped at thread exit, which collects this map and fires the finalizer
+        weakref.finalize(self, _release_thread_conns, self.owned)
+
+def _release_thread_conns(owned: List[sqlite3.Connection]):
+    with _all_conns_lock:
+        _all_conns[:] = [(t, c) for t, c in _all_conns if not any(c is o for o in owned)]
+    _close_quietly(owned)
+
+def _reap_dead_threads():
+    # fallback for thread-local maps kept alive past their thread (e.g. by a reference cycle)
+    with _all_conns_lock:
+        dead = [c for t, c in _all_conns if not t.is_alive()]
+        _all_conns[:] = [(t, c) for t, c in _all_conns if t.is_alive()]
+    _close_quietly(dead)
+
+def _open_connection(db_path: str, readonly: bool) -> sqlite3.Connection:
+    # autocommit mode: transactions are opened explicitly by transaction()
+    if readonly:
+        uri = f"file:{Path(db_path).resolve().as_posix()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, isolation_level=None, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    else:
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(db_path, isolation_level=None, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    _reap_dead_threads()
+    with _all_conns_lock:
+        _all_conns.append((threading.current_thread(), conn))
+    return conn
+
+def get_connection(db_path: str, readonly: bool=False) -> sqlite3.Connection:
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = _ThreadConns()
+    key = (db_path, readonly)
+    conn = conns.get(key)
+    if conn is None:
+        conn = conns[key] = _open_connection(db_path, readonly)
+        conns.owned.append(conn)
+    return conn
+
+@contextmanager
+def transaction(db_path: str, immediate: bool=False) -> Iterator[sqlite3.Connection]:
+    conn = get_connection(db_path)
+    if conn.in_transaction:
+        # nested call (e.g. upsert_patient inside add_record) joins the outer transaction
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    changes = conn.total_changes
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
         conn.commit()
+        if conn.total_changes != changes:
+            _bump_write_generation(db_path)
+
+def close_all_connections():
+    with _all_conns_lock:
+        conns = [c for _, c in _all_conns]
+        _all_conns.clear()
+    _close_quietly(conns)
+    _local.conns = None
+
+@traced_db
+def schema_version(db_path: str) -> int:
+    return int(get_connection(db_path).execute("PRAGMA user_version").fetchone()[0])
+
+def _apply_migrations(conn: sqlite3.Connection):
+    for version, statements in MIGRATIONS:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # re-check under the write lock in case another process migrated first
+            if conn.execute("PRAGMA user_version").fetchone()[0] < version:
+                for stmt in statements:
+                    conn.execute(stmt)
+                conn.execute(f"PRAGMA user_version={int(version)}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+@traced_db
+def init_db(db_path: str):
+    conn = get_connection(db_path)
+    conn.executescript(SCHEMA)
+    _apply_migrations(conn)
 
 def _now():
     return datetime.utcnow().replace(microsecond=0).isoformat()
 
+def _upsert_patient(conn: sqlite3.Connection, name: str, dob: str=None, gender: str=None, phone: str=None, email: str=None) -> int:
+    conn.execute(
+        "INSERT OR IGNORE INTO patients(name, dob, gender, phone, email) VALUES (?,?,?,?,?)",
+        (name, dob, gender, phone, email)
+    )
+    cur = conn.execute("SELECT patient_id FROM patients WHERE name=?", (name,))
+    return int(cur.fetchone()[0])
+
+@traced_db
 def upsert_patient(db_path: str, name: str, dob: str=None, gender: str=None, phone: str=None, email: str=None) -> int:
-    with sqlite3.connect(db_path) as conn:
-        conn.execute(
-            "INSERT OR IGNORE INTO patients(name, dob, gender, phone, email) VALUES (?,?,?,?,?)",
-            (name, dob, gender, phone, email)
-        )
-        conn.commit()
-        cur = conn.execute("SELECT patient_id FROM patients WHERE name=?", (name,))
-        return int(cur.fetchone()[0])
+    with transaction(db_path) as conn:
+        return _upsert_patient(conn, name, dob, gender, phone, email)
 
+@traced_db
 def add_record(db_path: str, patient_name: str, record_type: str, content: str, source: str="manual") -> Dict[str, Any]:
-    pid = upsert_patient(db_path, patient_name)
-    with sqlite3.connect(db_path) as conn:
+    with transaction(db_path) as conn:
+        pid = _upsert_patient(conn, patient_name)
         conn.execute(
             "INSERT INTO patient_records(patient_id, created_at, record_type, content, source) VALUES (?,?,?,?,?)",
             (pid, _now(), record_type, content, source)
         )
-        conn.commit()
     return {"patient": patient_name, "record_type": record_type, "status": "added"}
 
+@traced_db
 def get_patient_records(db_path: str, patient_name: str, limit: int=50):
-    with sqlite3.connect(db_path) as conn:
-        cur = conn.execute("SELECT patient_id FROM patients WHERE name=?", (patient_name,))
-        row = cur.fetchone()
-        if not row:
-            return []
-        pid = row[0]
-        cur = conn.execute(
-            "SELECT created_at, record_type, content, source FROM patient_records WHERE patient_id=? ORDER BY created_at DESC LIMIT ?",
-            (pid, limit)
+    conn = get_connection(db_path)
+    cur = conn.execute("SELECT patient_id FROM patients WHERE name=?", (patient_name,))
+    row = cur.fetchone()
+    if not row:
+        return []
+    pid = row[0]
+    cur = conn.execute(SQL_PATIENT_RECORDS, (pid, limit))
+    rows = cur.fetchall()
+    return [{"record_id": r[0], "created_at": r[1], "record_type": r[2], "content": r[3], "source": r[4]} for r in rows]
+
+FTS_STOPWORDS = {"a", "an", "and", "are", "as", "at", "be", "by", "did", "do", "does", "for", "from", "has", "have", "how",
+                 "i", "in", "is", "it", "my", "of", "on", "or", "she", "he", "the", "their", "to", "was", "were", "what",
+                 "when", "where", "which", "who", "why", "with"}
+_FTS_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 OR-query of quoted terms (no user-supplied FTS syntax)."""
+    terms = [t for t in _FTS_TOKEN_RE.findall((text or "").lower()) if len(t) > 1 and t not in FTS_STOPWORDS]
+    return " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+
+@traced_db
+def search_patient_records(db_path: str, patient_name: str, query: str, limit: int=10):
+    """Records of one patient ranked by BM25 relevance to `query` (best first)."""
+    match = fts_query(query)
+    if not match:
+        return []
+    conn = get_connection(db_path)
+    row = conn.execute("SELECT patient_id FROM patients WHERE name=?", (patient_name,)).fetchone()
+    if not row:
+        return []
+    rows = conn.execute(SQL_SEARCH_PATIENT_RECORDS, (f'patient_id : "{int(row[0])}" AND content : ({match})', limit)).fetchall()
+    return [{"record_id": r[0], "created_at": r[1], "record_type": r[2], "content": r[3], "source": r[4], "score": round(-r[5], 3)}
+            for r in rows]
+
+@traced_db
+def get_record_summaries(db_path: str, record_ids: List[int]) -> Dict[int, str]:
+    if not record_ids:
+        return {}
+    q = f"SELECT record_id, summary FROM record_summaries WHERE record_id IN ({','.join('?' * len(record_ids))})"
+    return {r[0]: r[1] for r in get_connection(db_path).execute(q, list(record_ids)).fetchall()}
+
+@traced_db
+def save_record_summaries(db_path: str, summaries: Dict[int, tuple]):
+    """summaries: record_id -> (summary, original content length)."""
+    if not summaries:
+        return
+    with transaction(db_path) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO record_summaries(record_id, summary, content_chars, created_at) VALUES (?,?,?,?)",
+            [(rid, summary, chars, _now()) for rid, (summary, chars) in summaries.items()]
         )
-        rows = cur.fetchall()
-    return [{"created_at": r[0], "record_type": r[1], "content": r[2], "source": r[3]} for r in rows]
 
+@traced_db
 def find_doctors(db_path: str, specialty: str=None):
     q = "SELECT doctor_id, name, specialty FROM doctors"
     params = ()
     if specialty:
-        q += " WHERE lower(specialty)=lower(?)"
+        q = SQL_DOCTORS_BY_SPECIALTY
         params = (specialty,)
-    with sqlite3.connect(db_path) as conn:
-        cur = conn.execute(q, params)
-        rows = cur.fetchall()
+    rows = get_connection(db_path).execute(q, params).fetchall()
     return [{"doctor_id": r[0], "name": r[1], "specialty": r[2]} for r in rows]
 
-def list_patients(db_path: str, limit: int=100):
-    with sqlite3.connect(db_path) as conn:
-        cur = conn.execute("SELECT patient_id, name, dob, gender FROM patients ORDER BY name LIMIT ?", (limit,))
-        rows = cur.fetchall()
-    return [{"patient_id": r[0], "name": r[1], "dob": r[2], "gender": r[3]} for r in rows]
+@traced_db
+def find_patient_names(db_path: str, names: List[str]) -> List[str]:
+    if not names:
+        return []
+    q = f"SELECT name FROM patients WHERE name IN ({','.join('?' * len(names))})"
+    return [r[0] for r in get_connection(db_path).execute(q, list(names)).fetchall()]
 
-def list_appointments(db_path: str, limit: int=100):
-    q = """
-    SELECT a.appointment_id, p.name, d.name, d.specialty, a.start_time, a.end_time, a.status, a.reason
-    FROM appointments a
-    JOIN patients p ON p.patient_id=a.patient_id
-    JOIN doctors d ON d.doctor_id=a.doctor_id
-    ORDER BY a.start_time DESC
-    LIMIT ?
+@traced_db
+def list_appointment_conflicts(db_path: str, readonly: bool=False) -> List[Dict[str, Any]]:
+    """Appointments set to 'Conflict' by the double-booking migrations, with the booking that was kept."""
+    rows = get_connection(db_path, readonly=readonly).execute(
+        "SELECT c.appointment_id, c.kept_appointment_id, p.name, d.name, c.start_time, c.flagged_at, c.reason "
+        "FROM appointment_conflicts c JOIN appointments a ON a.appointment_id=c.appointment_id "
+        "LEFT JOIN patients p ON p.patient_id=a.patient_id LEFT JOIN doctors d ON d.doctor_id=c.doctor_id "
+        "WHERE a.status='Conflict' ORDER BY c.start_time"
+    ).fetchall()
+    return [{"appointment_id": r[0], "kept_appointment_id": r[1], "patient": r[2], "doctor": r[3], "start_time": r[4],
+             "flagged_at": r[5], "reason": r[6]} for r in rows]
+
+DEFAULT_PAGE_SIZE = 50
+# upper bound for prefix ranges: sorts after any character that can follow the prefix
+_PREFIX_END = chr(0x10FFFF)
+
+def _day_after(day_iso: str) -> str:
+    return (datetime.fromisoformat(day_iso[:10]) + timedelta(days=1)).date().isoformat()
+
+@traced_db
+def page_patients(db_path: str, name_prefix: str=None, after: List[Any]=None, limit: int=DEFAULT_PAGE_SIZE,
+                  readonly: bool=False) -> Dict[str, Any]:
+    """One page of patients ordered by name (case-insensitive).
+
+    `after` is the `next_cursor` of the previous page; `next_cursor` is None on the last page.
     """
-    with sqlite3.connect(db_path) as conn:
-        cur = conn.execute(q, (limit,))
-        rows = cur.fetchall()
-    return [{
+    q, params = patients_page_query(name_prefix, after, limit)
+    rows = get_connection(db_path, readonly=readonly).execute(q, params).fetchall()
+    page = [{"patient_id": r[0], "name": r[1], "dob": r[2], "gender": r[3]} for r in rows[:limit]]
+    cursor = [page[-1]["name"], page[-1]["patient_id"]] if len(rows) > limit else None
+    return {"rows": page, "next_cursor": cursor}
+
+def patients_page_query(name_prefix: str=None, after: List[Any]=None, limit: int=DEFAULT_PAGE_SIZE):
+    where, params = [], []
+    if name_prefix:
+        where.append("name>=? COLLATE NOCASE AND name<? COLLATE NOCASE")
+        params += [name_prefix, name_prefix + _PREFIX_END]
+    if after:
+        where.append("(name COLLATE NOCASE, patient_id)>(?, ?)")
+        params += list(after)
+    q = ("SELECT patient_id, name, dob, gender FROM patients"
+         + (" WHERE " + " AND ".join(where) if where else "")
+         + " ORDER BY name COLLATE NOCASE, patient_id LIMIT ?")
+    return q, params + [limit + 1]  # one extra row tells whether another page exists
+
+@traced_db
+def page_appointments(db_path: str, doctor_id: int=None, specialty: str=None, start_date: str=None, end_date: str=None,
+                      status: str=None, patient_prefix: str=None, after: List[Any]=None, limit: int=DEFAULT_PAGE_SIZE,
+                      readonly: bool=False) -> Dict[str, Any]:
+    """One page of appointments, newest first, filtered server-side.
+
+    start_date/end_date are inclusive ISO days. The page is cut from appointments alone
+    (keyset on start_time, appointment_id) and only those rows are joined to names.
+    """
+    q, params = appointments_page_query(doctor_id, specialty, start_date, end_date, status, patient_prefix, after, limit)
+    rows = get_connection(db_path, readonly=readonly).execute(q, params).fetchall()
+    page = [{
         "appointment_id": r[0],
         "patient": r[1],
         "doctor": r[2],
@@ -125,43 +438,183 @@ def list_appointments(db_path: str, limit: int=100):
         "end_time": r[5],
         "status": r[6],
         "reason": r[7],
-    } for r in rows]
+    } for r in rows[:limit]]
+    cursor = [page[-1]["start_time"], page[-1]["appointment_id"]] if len(rows) > limit else None
+    return {"rows": page, "next_cursor": cursor}
 
-def get_available_slots(db_path: str, doctor_id: int, day_iso: str, start_hour: int=9, end_hour: int=17, slot_minutes: int=30):
-    day = datetime.fromisoformat(day_iso)
-    slots = []
-    start = day.replace(hour=start_hour, minute=0, second=0, microsecond=0)
-    end = day.replace(hour=end_hour, minute=0, second=0, microsecond=0)
-    with sqlite3.connect(db_path) as conn:
-        cur = conn.execute(
-            "SELECT start_time, end_time FROM appointments WHERE doctor_id=? AND start_time LIKE ?",
-            (doctor_id, f"{day_iso}%")
-        )
-        booked = [(datetime.fromisoformat(r[0]), datetime.fromisoformat(r[1])) for r in cur.fetchall()]
-    t = start
-    delta = timedelta(minutes=slot_minutes)
-    while t + delta <= end:
-        cand = (t, t+delta)
-        overlap = any(not (cand[1] <= b0 or cand[0] >= b1) for b0, b1 in booked)
-        if not overlap:
-            slots.append({"start_time": cand[0].isoformat(), "end_time": cand[1].isoformat()})
+def appointments_page_query(doctor_id: int=None, specialty: str=None, start_date: str=None, end_date: str=None,
+                            status: str=None, patient_prefix: str=None, after: List[Any]=None, limit: int=DEFAULT_PAGE_SIZE):
+    where, params = [], []
+    if doctor_id is not None:
+        where.append("doctor_id=?")
+        params.append(doctor_id)
+    if specialty:
+        where.append("doctor_id IN (SELECT doctor_id FROM doctors WHERE lower(specialty)=lower(?))")
+        params.append(specialty)
+    if start_date:
+        where.append("start_time>=?")
+        params.append(start_date[:10])
+    if end_date:
+        where.append("start_time<?")
+        params.append(_day_after(end_date))
+    if status:
+        where.append("status=?")
+        params.append(status)
+    if patient_prefix:
+        where.append("patient_id IN (SELECT patient_id FROM patients WHERE name>=? COLLATE NOCASE AND name<? COLLATE NOCASE)")
+        params += [patient_prefix, patient_prefix + _PREFIX_END]
+    if after:
+        where.append("(start_time, appointment_id)<(?, ?)")
+        params += list(after)
+    q = f"""
+    SELECT a.appointment_id, p.name, d.name, d.specialty, a.start_time, a.end_time, a.status, a.reason
+    FROM (
+      SELECT appointment_id, patient_id, doctor_id, start_time, end_time, status, reason FROM appointments
+      {"WHERE " + " AND ".join(where) if where else ""}
+      ORDER BY start_time DESC, appointment_id DESC LIMIT ?
+    ) a
+    LEFT JOIN patients p ON p.patient_id=a.patient_id
+    LEFT JOIN doctors d ON d.doctor_id=a.doctor_id
+    ORDER BY a.start_time DESC, a.appointment_id DESC
+    """
+    return q, params + [limit + 1]
+
+@traced_db
+def list_patients(db_path: str, limit: int=100, readonly: bool=False):
+    return page_patients(db_path, limit=limit, readonly=readonly)["rows"]
+
+@traced_db
+def list_appointments(db_path: str, limit: int=100, readonly: bool=False):
+    return page_appointments(db_path, limit=limit, readonly=readonly)["rows"]
+
+def _merge_intervals(intervals: List[tuple]) -> List[tuple]:
+    merged = []
+    for b0, b1 in sorted(intervals):
+        if merged and b0 <= merged[-1][1]:
+            if b1 > merged[-1][1]:
+                merged[-1] = (merged[-1][0], b1)
+        else:
+            merged.append((b0, b1))
+    return merged
+
+def _free_slots_for_day(day_start: datetime, day_end: datetime, merged: List[tuple], delta: timedelta) -> Iterator[tuple]:
+    # single sweep over the slot grid and the merged bookings: O(slots + bookings)
+    t = day_start
+    j = 0
+    while t + delta <= day_end:
+        while j < len(merged) and merged[j][1] <= t:
+            j += 1
+        if j < len(merged) and merged[j][0] < t + delta:
+            # jump to the first grid slot at or after the end of this busy block
+            steps = -(-(merged[j][1] - day_start) // delta)
+            t = day_start + steps * delta
+            continue
+        yield (t, t + delta)
         t += delta
-    return slots
 
+@traced_db
+def find_free_slots(db_path: str, doctor_ids: List[int], start_day: str, days: int=1, start_hour: int=9, end_hour: int=17, slot_minutes: int=30, limit: int=None) -> List[Dict[str, Any]]:
+    if not doctor_ids:
+        return []
+    first = datetime.fromisoformat(start_day).date()
+    last = first + timedelta(days=days)
+    window_start = datetime.combine(first, datetime.min.time())
+    # one indexed range query for every doctor and day in the window; the lower bound reaches
+    # back MAX_APPOINTMENT so bookings running past midnight into the window are seen
+    rows = get_connection(db_path).execute(
+        SQL_BOOKED_INTERVALS.format(doctors=",".join("?" * len(doctor_ids))),
+        (*doctor_ids, (window_start - MAX_APPOINTMENT).isoformat(), last.isoformat())
+    ).fetchall()
+    booked: Dict[tuple, List[tuple]] = {}
+    for doctor_id, b0, b1 in rows:
+        s0, s1 = datetime.fromisoformat(b0), datetime.fromisoformat(b1)
+        # clip to each calendar day of the window the booking touches
+        day = max(s0.date(), first)
+        while day < last and datetime.combine(day, datetime.min.time()) < s1:
+            d0 = datetime.combine(day, datetime.min.time())
+            booked.setdefault((doctor_id, day), []).append((max(s0, d0), min(s1, d0 + timedelta(days=1))))
+            day += timedelta(days=1)
+
+    delta = timedelta(minutes=slot_minutes)
+    rank = {d: i for i, d in enumerate(doctor_ids)}
+    streams = []
+    for doctor_id in doctor_ids:
+        def _doctor_slots(doctor_id=doctor_id):
+            for offset in range(days):
+                day = datetime.combine(first + timedelta(days=offset), datetime.min.time())
+                merged = _merge_intervals(booked.get((doctor_id, day.date()), []))
+                for s0, s1 in _free_slots_for_day(day + timedelta(hours=start_hour), day + timedelta(hours=end_hour), merged, delta):
+                    yield (s0, rank[doctor_id], doctor_id, s1)
+        streams.append(_doctor_slots())
+    # earliest slot first across doctors; ties go to the doctor listed first
+    merged_stream = heapq.merge(*streams)
+    out = []
+    for s0, _, doctor_id, s1 in merged_stream:
+        out.append({"doctor_id": doctor_id, "start_time": s0.isoformat(), "end_time": s1.isoformat()})
+        if limit is not None and len(out) >= limit:
+            break
+    return out
+
+@traced_db
+def get_available_slots(db_path: str, doctor_id: int, day_iso: str, start_hour: int=9, end_hour: int=17, slot_minutes: int=30):
+    slots = find_free_slots(db_path, [doctor_id], day_iso, days=1, start_hour=start_hour, end_hour=end_hour, slot_minutes=slot_minutes)
+    return [{"start_time": s["start_time"], "end_time": s["end_time"]} for s in slots]
+
+def _check_duration(start: datetime, end: datetime):
+    # the overlap trigger and SQL_OVERLAPPING_BOOKING only look back MAX_APPOINTMENT, so longer
+    # bookings could hide overlaps; reject them with the same error type the trigger raises
+    if not start < end <= start + MAX_APPOINTMENT:
+        raise sqlite3.IntegrityError(f"appointment must end after it starts and last at most {MAX_APPOINTMENT.total_seconds() / 3600:g} hours")
+
+@traced_db
 def book_appointment(db_path: str, patient_name: str, doctor_id: int, start_time: str, end_time: str, reason: str=""):
-    pid = upsert_patient(db_path, patient_name)
-    with sqlite3.connect(db_path) as conn:
-        conn.execute(
+    _check_duration(datetime.fromisoformat(start_time), datetime.fromisoformat(end_time))
+    with transaction(db_path) as conn:
+        pid = _upsert_patient(conn, patient_name)
+        cur = conn.execute(
             "INSERT INTO appointments(patient_id, doctor_id, start_time, end_time, status, reason, created_at) VALUES (?,?,?,?,?,?,?)",
             (pid, doctor_id, start_time, end_time, "Booked", reason, _now())
         )
-        conn.commit()
-        appt_id = int(conn.execute("SELECT last_insert_rowid()").fetchone()[0])
+        appt_id = int(cur.lastrowid)
     return {"appointment_id": appt_id, "patient": patient_name, "doctor_id": doctor_id, "start_time": start_time, "end_time": end_time, "status": "Booked"}
 
-def seed_demo_data(db_path: str, pdf_sources_dir: str, records_xlsx: str=None):
+@traced_db
+def reserve_slot(db_path: str, patient_name: str, doctor_id: int, start_time: str, end_time: str, reason: str="",
+                 start_hour: int=9, end_hour: int=17, search_days: int=1, max_attempts: int=10):
+    requested = start_time
+    start, end = datetime.fromisoformat(start_time), datetime.fromisoformat(end_time)
+    _check_duration(start, end)
+    duration = end - start
+    for attempt in range(max_attempts):
+        try:
+            # BEGIN IMMEDIATE takes the write lock up front, so the overlap check and the
+            # insert cannot interleave with another booking
+            with transaction(db_path, immediate=True) as conn:
+                taken = conn.execute(SQL_OVERLAPPING_BOOKING, (doctor_id, (start - MAX_APPOINTMENT).isoformat(), end.isoformat(), start.isoformat())).fetchone()
+                if not taken:
+                    pid = _upsert_patient(conn, patient_name)
+                    cur = conn.execute(
+                        "INSERT INTO appointments(patient_id, doctor_id, start_time, end_time, status, reason, created_at) VALUES (?,?,?,?,?,?,?)",
+                        (pid, doctor_id, start.isoformat(), end.isoformat(), "Booked", reason, _now())
+                    )
+                    return {"appointment_id": int(cur.lastrowid), "patient": patient_name, "doctor_id": doctor_id,
+                            "start_time": start.isoformat(), "end_time": end.isoformat(), "status": "Booked",
+                            "requested_start_time": requested, "attempts": attempt + 1}
+        except sqlite3.IntegrityError:
+            pass  # lost to the unique index / overlap trigger; treat like a taken slot
+        # slot taken: move to the next free slot of the same length after this one
+        free = find_free_slots(db_path, [doctor_id], start.date().isoformat(), days=search_days, start_hour=start_hour,
+                               end_hour=end_hour, slot_minutes=int(duration.total_seconds() // 60))
+        nxt = next((f for f in free if f["start_time"] > start.isoformat()), None)
+        if nxt is None:
+            return None
+        start, end = datetime.fromisoformat(nxt["start_time"]), datetime.fromisoformat(nxt["end_time"])
+    return None
+
+@traced_db
+def seed_demo_data(db_path: str, pdf_sources_dir: str, records_xlsx: str=None, workers: int=None):
     init_db(db_path)
-    with sqlite3.connect(db_path) as conn:
+    with transaction(db_path) as conn:
         if conn.execute("SELECT COUNT(*) FROM doctors").fetchone()[0] == 0:
             conn.executemany("INSERT INTO doctors(name, specialty) VALUES (?,?)", [
                 ("Dr. Smith", "Cardiology"),
@@ -169,12 +622,12 @@ def seed_demo_data(db_path: str, pdf_sources_dir: str, records_xlsx: str=None):
                 ("Dr. Chen", "General Medicine"),
                 ("Dr. Rao", "Endocrinology"),
             ])
-            conn.commit()
 
     import os
-    from pypdf import PdfReader
+    from src.ingest import extract_pdf_texts
     if os.path.isdir(pdf_sources_dir):
-        for fn in os.listdir(pdf_sources_dir):
+        reports = []
+        for fn in sorted(os.listdir(pdf_sources_dir)):
             if not fn.lower().endswith(".pdf"):
                 continue
             m = re.search(r"sample_report[_-]([a-zA-Z]+)", fn, re.IGNORECASE)
@@ -182,15 +635,14 @@ def seed_demo_data(db_path: str, pdf_sources_dir: str, records_xlsx: str=None):
                 continue
             name = m.group(1).capitalize()
             upsert_patient(db_path, name)
-            try:
-                reader = PdfReader(str(Path(pdf_sources_dir)/fn))
-                text = "\n".join((p.extract_text() or "") for p in reader.pages)[:8000]
-                if text.strip():
-                    add_record(db_path, name, "ImportedReport", text, source=fn)
-            except Exception:
-                pass
-
-    with sqlite3.connect(db_path) as conn:
+            reports.append((Path(pdf_sources_dir)/fn, name))
+        names = {str(p): name for p, name in reports}
+        # text extraction fans out over a process pool; inserts stay on this thread
+        for path, text in extract_pdf_texts([p for p, _ in reports], max_chars=8000, workers=workers):
+            if text.strip():
+                add_record(db_path, names[str(path)], "ImportedReport", text, source=path.name)
+
+    with transaction(db_path) as conn:
         if conn.execute("SELECT COUNT(*) FROM appointments").fetchone()[0] == 0:
             doc = conn.execute("SELECT doctor_id FROM doctors ORDER BY doctor_id LIMIT 1").fetchone()
             pat = conn.execute("SELECT patient_id, name FROM patients ORDER BY patient_id LIMIT 1").fetchone()
@@ -203,4 +655,3 @@ def seed_demo_data(db_path: str, pdf_sources_dir: str, records_xlsx: str=None):
                     "INSERT INTO appointments(patient_id, doctor_id, start_time, end_time, status, reason, created_at) VALUES (?,?,?,?,?,?,?)",
                     (pat[0], doctor_id, start.isoformat(), end.isoformat(), "Booked", "Routine checkup", _now())
                 )
-                conn.commit()
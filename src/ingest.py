@@ -0,0 +1,129 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_EMBED_BATCH_SIZE = 64
+
+def _resolve_workers(workers: Optional[int]) -> int:
+    return workers if workers and workers > 0 else (os.cpu_count() or 1)
+
+def extract_pdf_pages(path: str) -> List[str]:
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [(p.extract_text() or "") for p in reader.pages]
+
+def extract_pdf_text(path: str, max_chars: int=None) -> str:
+    try:
+        text = "\n".join(extract_pdf_pages(path))
+    except Exception:
+        return ""
+    return text[:max_chars] if max_chars else text
+
+def _load_and_split(path: str, sha: str, chunk_size: int, chunk_overlap: int) -> List[Tuple[str, Dict[str, Any], str]]:
+    # runs in a worker process; returns plain tuples so results pickle cheaply
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    # the file name keeps ids unique when the same PDF is present under two names
+    prefix = f"{sha[:16]}:{Path(path).name}"
+    out = []
+    for page_no, text in enumerate(extract_pdf_pages(path)):
+        for chunk in splitter.split_text(text):
+            out.append((chunk, {"source": path, "page": page_no}, f"{prefix}:{len(out)}"))
+    return out
+
+def _bounded_map(fn: Callable, arg_list: List[tuple], workers: int) -> Iterator[Tuple[tuple, Any]]:
+    # inline for tiny inputs; otherwise keep at most 2*workers files in flight so memory stays bounded
+    if workers <= 1 or len(arg_list) <= 1:
+        for args in arg_list:
+            yield args, fn(*args)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: List[Tuple[tuple, Future]] = []
+        it = iter(arg_list)
+        for args in it:
+            pending.append((args, pool.submit(fn, *args)))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            args, fut = pending.pop(0)
+            yield args, fut.result()
+            nxt = next(it, None)
+            if nxt is not None:
+                pending.append((nxt, pool.submit(fn, *nxt)))
+
+def iter_pdf_chunks(files: List[Tuple[Path, str]], chunk_size: int, chunk_overlap: int, workers: int=None) -> Iterator[Tuple[Path, List[Tuple[str, Dict[str, Any], str]]]]:
+    """Yield (path, [(text, metadata, chunk_id), ...]) per PDF, parsed and split in a process pool."""
+    arg_list = [(str(p), sha, chunk_size, chunk_overlap) for p, sha in files]
+    for args, chunks in _bounded_map(_load_and_split, arg_list, _resolve_workers(workers)):
+        yield Path(args[0]), chunks
+
+def extract_pdf_texts(paths: List[Path], max_chars: int=None, workers: int=None) -> Iterator[Tuple[Path, str]]:
+    arg_list = [(str(p), max_chars) for p in paths]
+    for args, text in _bounded_map(extract_pdf_text, arg_list, _resolve_workers(workers)):
+        yield Path(args[0]), text
+
+def embed_in_batches(db, embeddings, chunks: Iterable[Tuple[str, Dict[str, Any], str]], batch_size: int=DEFAULT_EMBED_BATCH_SIZE,
+                     progress: Callable[[Dict[str, Any]], None]=None, create_store: Callable[[Any], Any]=None, warmup: int=0):
+    """Embed chunks batch by batch and add them to `db`.
+
+    If `db` is None the store is created from the first `warmup` embedded vectors via
+    `create_store(vectors)` (trained index types need a sample), or as a flat index.
+    """
+    from langchain_community.vectorstores import FAISS
+    t0 = time.perf_counter()
+    done = 0
+    batch: List[Tuple[str, Dict[str, Any], str]] = []
+    pending: List[Tuple[List[Tuple[str, Dict[str, Any], str]], List[List[float]]]] = []
+    pending_count = 0
+
+    def _add(db, items, vectors):
+        pairs = list(zip([c[0] for c in items], vectors))
+        metadatas = [c[1] for c in items]
+        ids = [c[2] for c in items]
+        if db is None:
+            if create_store is None:
+                return FAISS.from_embeddings(pairs, embeddings, metadatas=metadatas, ids=ids)
+            import numpy as np
+            db = create_store(np.asarray(vectors, dtype="float32"))
+        db.add_embeddings(pairs, metadatas=metadatas, ids=ids)
+        return db
+
+    def _drain(db):
+        nonlocal pending_count
+        if pending:
+            items = [c for b, _ in pending for c in b]
+            vectors = [v for _, vs in pending for v in vs]
+            pending.clear()
+            pending_count = 0
+            db = _add(db, items, vectors)
+        return db
+
+    def _flush(db, final: bool=False):
+        nonlocal done, pending_count
+        if batch:
+            vectors = embeddings.embed_documents([c[0] for c in batch])
+            if db is None and create_store is not None:
+                # hold vectors until there are enough to train the index on
+                pending.append((list(batch), vectors))
+                pending_count += len(batch)
+                if pending_count >= warmup:
+                    db = _drain(db)
+            else:
+                db = _add(db, batch, vectors)
+            done += len(batch)
+            batch.clear()
+            if progress:
+                elapsed = time.perf_counter() - t0
+                progress({"chunks_embedded": done, "seconds": round(elapsed, 3), "chunks_per_second": round(done / elapsed, 1) if elapsed else 0.0})
+        if final:
+            db = _drain(db)
+        return db
+
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            db = _flush(db)
+    db = _flush(db, final=True)
+    return db, done
@@ -1,33 +1,432 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
 from pathlib import Path
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from typing import TYPE_CHECKING, Dict, Any, Callable, Tuple
 
-def init_kb(pdf_dir: str, faiss_dir: str, embedding_model: str):
+from config import settings
+from src.bm25 import BM25Index
+from src.ingest import DEFAULT_EMBED_BATCH_SIZE, iter_pdf_chunks, embed_in_batches
+
+if TYPE_CHECKING:  # langchain_community/faiss are imported lazily to keep app start-up fast
+    from langchain_community.vectorstores import FAISS
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+INDEX_FILES = ("index.faiss", "index.pkl")
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw_sq")
+# faiss wants ~39 training points per IVF list; below a handful of lists IVF is pointless
+IVF_POINTS_PER_LIST = 39
+IVF_MIN_LISTS = 4
+
+_EMBEDDINGS: Dict[str, "HuggingFaceEmbeddings"] = {}
+_EMBEDDINGS_LOCK = threading.Lock()
+
+def get_embeddings(embedding_model: str) -> "HuggingFaceEmbeddings":
+    with _EMBEDDINGS_LOCK:
+        emb = _EMBEDDINGS.get(embedding_model)
+        if emb is None:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            emb = HuggingFaceEmbeddings(model_name=embedding_model)
+            _EMBEDDINGS[embedding_model] = emb
+        return emb
+
+def register_embeddings(embedding_model: str, embeddings):
+    """Pre-seed the embedder cache, e.g. with a fake model for offline benchmarks."""
+    with _EMBEDDINGS_LOCK:
+        _EMBEDDINGS[embedding_model] = embeddings
+
+def _index_signature(faiss_dir: str) -> Tuple[Tuple[int, int], ...]:
+    sig = []
+    for name in INDEX_FILES:
+        st = os.stat(Path(faiss_dir) / name)
+        sig.append((st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
+def kb_version(faiss_dir: str) -> str:
+    return ":".join(f"{m}-{n}" for m, n in _index_signature(faiss_dir))
+
+def _peak_rss_bytes() -> int:
+    if resource is None:
+        return 0
+    return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) * 1024
+
+def index_params() -> Dict[str, int]:
+    return {
+        "nlist": settings.FAISS_NLIST,
+        "pq_m": settings.FAISS_PQ_M,
+        "pq_bits": settings.FAISS_PQ_BITS,
+        "hnsw_m": settings.FAISS_HNSW_M,
+    }
+
+def build_faiss_index(index_type: str, train_vectors, params: Dict[str, int]=None):
+    """Return (empty trained faiss index, actual type); small samples fall back to simpler types."""
+    import faiss
+    params = params or index_params()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type {index_type!r}; expected one of {INDEX_TYPES}")
+    n, d = train_vectors.shape
+    if index_type in ("ivf_flat", "ivf_pq"):
+        nlist = min(params["nlist"], n // IVF_POINTS_PER_LIST)
+        if nlist < IVF_MIN_LISTS:
+            return faiss.IndexFlatL2(d), "flat"
+        if index_type == "ivf_pq" and n < (1 << params["pq_bits"]):
+            index_type = "ivf_flat"
+        quantizer = faiss.IndexFlatL2(d)
+        if index_type == "ivf_pq":
+            m = max(1, min(params["pq_m"], d))
+            while d % m:
+                m -= 1
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, m, params["pq_bits"])
+        else:
+            index = faiss.IndexIVFFlat(quantizer, d, nlist)
+        index.train(train_vectors)
+        return index, index_type
+    if index_type == "hnsw_sq":
+        index = faiss.IndexHNSWSQ(d, faiss.ScalarQuantizer.QT_8bit, params["hnsw_m"])
+        index.train(train_vectors)
+        return index, index_type
+    return faiss.IndexFlatL2(d), "flat"
+
+def apply_search_params(index, nprobe: int=None, ef_search: int=None):
+    import faiss
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe or settings.FAISS_NPROBE
+    except Exception:
+        pass  # not an IVF index
+    hnsw = getattr(index, "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = ef_search or settings.FAISS_HNSW_EF_SEARCH
+
+def _load_bm25(faiss_dir: str):
+    try:
+        return BM25Index.load(faiss_dir)
+    except (OSError, ValueError, KeyError):
+        return None  # index built before hybrid retrieval; vector-only until the next rebuild
+
+_LOAD_ATTEMPTS = 3
+
+def _save_index(db: "FAISS", faiss_dir: str):
+    # save_local writes index.faiss and index.pkl in place; write them beside faiss_dir and move
+    # each in with os.replace so a reader never opens a half-written file
+    target = Path(faiss_dir)
+    with tempfile.TemporaryDirectory(prefix=f".{target.name}-", dir=target.parent) as tmp:
+        db.save_local(tmp)
+        for name in INDEX_FILES:
+            os.replace(Path(tmp) / name, target / name)
+
+class KBRegistry:
+    """Process-wide cache of loaded FAISS indexes, one per (faiss_dir, embedding_model).
+
+    An entry is reused until the index files on disk change; `put` swaps in a freshly
+    built index so readers holding the old one keep a consistent object.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._counters = {"hits": 0, "loads": 0, "reloads": 0, "swaps": 0, "load_seconds": 0.0, "last_load_seconds": 0.0}
+
+    @staticmethod
+    def _key(faiss_dir: str, embedding_model: str) -> Tuple[str, str]:
+        return (str(Path(faiss_dir).resolve()), embedding_model)
+
+    def get(self, faiss_dir: str, embedding_model: str) -> "FAISS":
+        key = self._key(faiss_dir, embedding_model)
+        sig = _index_signature(faiss_dir)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["signature"] == sig:
+                self._counters["hits"] += 1
+                return entry["db"]
+            from langchain_community.vectorstores import FAISS
+            t0 = time.perf_counter()
+            for _ in range(_LOAD_ATTEMPTS):
+                db = FAISS.load_local(faiss_dir, get_embeddings(embedding_model), allow_dangerous_deserialization=True)
+                bm25 = _load_bm25(faiss_dir)
+                # a rebuild swapped files in mid-load, so index.faiss and index.pkl may not match: read again
+                loaded, sig = sig, _index_signature(faiss_dir)
+                if loaded == sig:
+                    break
+            apply_search_params(db.index)
+            elapsed = time.perf_counter() - t0
+            self._counters["loads"] += 1
+            if entry:
+                self._counters["reloads"] += 1
+            self._counters["load_seconds"] += elapsed
+            self._counters["last_load_seconds"] = elapsed
+            self._entries[key] = {"db": db, "bm25": bm25, "signature": loaded, "loaded_at": time.time()}
+            return db
+
+    def get_bm25(self, faiss_dir: str, embedding_model: str):
+        self.get(faiss_dir, embedding_model)
+        with self._lock:
+            entry = self._entries.get(self._key(faiss_dir, embedding_model))
+            return entry["bm25"] if entry else None
+
+    def put(self, faiss_dir: str, embedding_model: str, db: "FAISS", bm25: BM25Index=None):
+        key = self._key(faiss_dir, embedding_model)
+        sig = _index_signature(faiss_dir)
+        with self._lock:
+            self._entries[key] = {"db": db, "bm25": bm25, "signature": sig, "loaded_at": time.time()}
+            self._counters["swaps"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = [{
+                "faiss_dir": k[0],
+                "embedding_model": k[1],
+                "vectors": int(e["db"].index.ntotal),
+                "index_bytes": sum(s[1] for s in e["signature"]),
+                "loaded_at": e["loaded_at"],
+            } for k, e in self._entries.items()]
+            out = dict(self._counters)
+        out["entries"] = entries
+        out["embedding_models"] = len(_EMBEDDINGS)
+        out["index_bytes"] = sum(e["index_bytes"] for e in entries)
+        out["peak_rss_bytes"] = _peak_rss_bytes()
+        return out
+
+kb_registry = KBRegistry()
+
+MANIFEST_FILE = "manifest.json"
+CHUNK_SIZE = 900
+CHUNK_OVERLAP = 120
+PLACEHOLDER_ID = "__placeholder__"
+PLACEHOLDER_TEXT = "No PDFs indexed yet. Add PDFs to data/pdf_sources and rebuild KB."
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def load_manifest(faiss_dir: str) -> Dict[str, Any]:
+    try:
+        with open(Path(faiss_dir) / MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_manifest(faiss_dir: str, manifest: Dict[str, Any]):
+    path = Path(faiss_dir) / MANIFEST_FILE
+    tmp = path.with_suffix(".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+def _can_update_in_place(manifest: Dict[str, Any], faiss_dir: str, embedding_model: str, index_type: str) -> bool:
+    if not manifest or manifest.get("embedding_model") != embedding_model:
+        return False
+    if manifest.get("index_type", "flat") != index_type:
+        return False
+    if manifest.get("chunk_size") != CHUNK_SIZE or manifest.get("chunk_overlap") != CHUNK_OVERLAP:
+        return False
+    return all((Path(faiss_dir) / name).exists() for name in INDEX_FILES)
+
+def init_kb(pdf_dir: str, faiss_dir: str, embedding_model: str, full_rebuild: bool=False,
+            batch_size: int=DEFAULT_EMBED_BATCH_SIZE, workers: int=None, progress: Callable[[Dict[str, Any]], None]=None,
+            index_type: str=None):
+    from langchain_community.vectorstores import FAISS
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    t0 = time.perf_counter()
+    index_type = index_type or settings.FAISS_INDEX_TYPE
     pdf_path = Path(pdf_dir)
     pdfs = sorted([p for p in pdf_path.glob("*.pdf")])
-    docs = []
-    for p in pdfs:
-        loader = PyPDFLoader(str(p))
-        docs.extend(loader.load())
+    current = {p.name: _file_sha256(p) for p in pdfs}
+    embeddings = get_embeddings(embedding_model)
+
+    manifest = {} if full_rebuild else load_manifest(faiss_dir)
+    db = None
+    files: Dict[str, Any] = {}
+    incremental = False
+    built_type = manifest.get("built_index_type", "flat")
+    if _can_update_in_place(manifest, faiss_dir, embedding_model, index_type):
+        # load a private copy so readers keep the registry's index until the swap below
+        db = FAISS.load_local(faiss_dir, embeddings, allow_dangerous_deserialization=True)
+        files = manifest.get("files", {})
+        incremental = True
+        if db.index.ntotal != manifest.get("vectors"):
+            # index and manifest disagree (interrupted build): start over
+            db, files, incremental = None, {}, False
+
+    removed = [name for name, meta in files.items() if current.get(name) != meta["sha256"]]
+    added = [p for p in pdfs if files.get(p.name, {}).get("sha256") != current[p.name]]
+    has_placeholder = db is not None and PLACEHOLDER_ID in db.index_to_docstore_id.values()
+    if db is not None and built_type != "flat" and (removed or (has_placeholder and added)):
+        # IVF/HNSW ids are not compacted on removal, so deletions mean a rebuild
+        db, files, incremental, has_placeholder = None, {}, False, False
+        removed, added = [], list(pdfs)
+
+    stale_ids = [i for name in removed for i in files[name]["ids"]]
+    for name in removed:
+        files.pop(name)
+    if db is not None and stale_ids:
+        db.delete(stale_ids)
+
+    report = {"files_done": 0, "files_total": len(added), "chunks_embedded": 0}
+
+    def _new_chunks():
+        # PDFs are parsed/split in worker processes and streamed straight into the embedder
+        for path, chunks in iter_pdf_chunks([(p, current[p.name]) for p in added], CHUNK_SIZE, CHUNK_OVERLAP, workers=workers):
+            files[path.name] = {"sha256": current[path.name], "ids": [c[2] for c in chunks]}
+            report["files_done"] += 1
+            report["file"] = path.name
+            yield from chunks
 
-    splitter = RecursiveCharacterTextSplitter(chunk_size=900, chunk_overlap=120)
-    chunks = splitter.split_documents(docs) if docs else []
+    def _on_batch(batch_report: Dict[str, Any]):
+        report.update(batch_report)
+        if progress:
+            progress(dict(report))
 
-    embeddings = HuggingFaceEmbeddings(model_name=embedding_model)
-    if chunks:
-        db = FAISS.from_documents(chunks, embeddings)
-    else:
-        db = FAISS.from_texts(["No PDFs indexed yet. Add PDFs to data/pdf_sources and rebuild KB."], embeddings)
+    def _create_store(vectors):
+        nonlocal built_type
+        index, built_type = build_faiss_index(index_type, vectors)
+        apply_search_params(index)
+        return FAISS(embeddings, index, InMemoryDocstore(), {})
+
+    if db is None:
+        built_type = "flat"
+    warmup = settings.FAISS_TRAIN_SIZE if index_type != "flat" else 0
+    db, embedded = embed_in_batches(db, embeddings, _new_chunks(), batch_size=batch_size, progress=_on_batch,
+                                    create_store=_create_store if index_type != "flat" else None, warmup=warmup)
+
+    if has_placeholder and any(meta["ids"] for meta in files.values()):
+        db.delete([PLACEHOLDER_ID])
+        stale_ids.append(PLACEHOLDER_ID)
+    if db is None:
+        db = FAISS.from_texts([PLACEHOLDER_TEXT], embeddings, ids=[PLACEHOLDER_ID])
+        built_type = "flat"
+    elif db.index.ntotal == 0:
+        db.add_texts([PLACEHOLDER_TEXT], ids=[PLACEHOLDER_ID])
 
     Path(faiss_dir).mkdir(parents=True, exist_ok=True)
-    db.save_local(faiss_dir)
+    changed = not incremental or added or stale_ids
+    if changed:
+        # unchanged corpora keep their index files, so kb_version (and the response cache) stays valid
+        _save_index(db, faiss_dir)
+    bm25 = None if changed else _load_bm25(faiss_dir)
+    if bm25 is None:
+        # lexical index is cheap to rebuild from the docstore, so it is always rebuilt whole
+        bm25 = BM25Index.build((doc_id, db.docstore.search(doc_id).page_content) for doc_id in db.index_to_docstore_id.values())
+        bm25.save(faiss_dir)
+    _save_manifest(faiss_dir, {
+        "embedding_model": embedding_model,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "index_type": index_type,
+        "built_index_type": built_type,
+        "vectors": int(db.index.ntotal),
+        "files": files,
+        "last_build": {
+            "incremental": incremental,
+            "added_files": [p.name for p in added],
+            "removed_files": removed,
+            "embedded_chunks": embedded,
+            "deleted_vectors": len(stale_ids),
+            "seconds": round(time.perf_counter() - t0, 3),
+            "chunks_per_second": report.get("chunks_per_second", 0.0),
+        },
+    })
+    kb_registry.put(faiss_dir, embedding_model, db, bm25)
     return db
 
-def load_kb(faiss_dir: str, embedding_model: str) -> FAISS:
-    embeddings = HuggingFaceEmbeddings(model_name=embedding_model)
-    return FAISS.load_local(faiss_dir, embeddings, allow_dangerous_deserialization=True)
+def load_kb(faiss_dir: str, embedding_model: str) -> "FAISS":
+    return kb_registry.get(faiss_dir, embedding_model)
+
+def kb_stats() -> Dict[str, Any]:
+    return kb_registry.stats()
 
-def retrieve_medical_docs(db: FAISS, query: str, k: int=4):
+def load_bm25(faiss_dir: str, embedding_model: str):
+    return kb_registry.get_bm25(faiss_dir, embedding_model)
+
+def retrieve_medical_docs(db: "FAISS", query: str, k: int=4):
     return db.similarity_search(query, k=k)
+
+_RERANKERS: Dict[str, Any] = {}
+_RERANKERS_LOCK = threading.Lock()
+
+def get_reranker(model_name: str):
+    if not model_name:
+        return None
+    with _RERANKERS_LOCK:
+        model = _RERANKERS.get(model_name)
+        if model is None:
+            from sentence_transformers import CrossEncoder
+            model = _RERANKERS[model_name] = CrossEncoder(model_name, device="cpu")
+        return model
+
+def _min_max(scores: Dict[str, float]) -> Dict[str, float]:
+    if not scores:
+        return {}
+    lo, hi = min(scores.values()), max(scores.values())
+    if hi == lo:
+        return {k: 1.0 for k in scores}
+    return {k: (v - lo) / (hi - lo) for k, v in scores.items()}
+
+def hybrid_search(db: "FAISS", bm25: BM25Index, query: str, k: int=4, candidates: int=20, alpha: float=None,
+                  reranker_model: str=None) -> Tuple[list, Dict[str, float]]:
+    """Fuse vector and BM25 candidates, optionally re-rank on CPU; returns (docs, per-stage ms)."""
+    alpha = settings.HYBRID_ALPHA if alpha is None else alpha
+    reranker_model = settings.RERANKER_MODEL if reranker_model is None else reranker_model
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    vec_hits = db.similarity_search_with_score(query, k=candidates)
+    t1 = time.perf_counter()
+    timings["vector_ms"] = round((t1 - t0) * 1000, 2)
+
+    # older pickled docstores may lack Document.id; key those by rank so they still fuse
+    keys = [d.id or f"_vec{i}" for i, (d, _) in enumerate(vec_hits)]
+    docs = {key: d for key, (d, _) in zip(keys, vec_hits)}
+    # L2 distance -> similarity so both score sets are "higher is better" before normalizing
+    vec_scores = _min_max({key: 1.0 / (1.0 + float(dist)) for key, (_, dist) in zip(keys, vec_hits)})
+    lex_scores: Dict[str, float] = {}
+    if bm25 is not None:
+        lex_scores = _min_max(dict(bm25.search(query, k=candidates)))
+        for doc_id in lex_scores:
+            if doc_id not in docs:
+                doc = db.docstore.search(doc_id)
+                if not isinstance(doc, str):  # InMemoryDocstore returns a message string for missing ids
+                    docs[doc_id] = doc
+    t2 = time.perf_counter()
+    timings["bm25_ms"] = round((t2 - t1) * 1000, 2)
+
+    fused = {doc_id: alpha * vec_scores.get(doc_id, 0.0) + (1 - alpha) * lex_scores.get(doc_id, 0.0) for doc_id in docs}
+    ranked = [docs[doc_id] for doc_id, _ in sorted(fused.items(), key=lambda x: x[1], reverse=True)]
+    t3 = time.perf_counter()
+    timings["fusion_ms"] = round((t3 - t2) * 1000, 2)
+
+    reranker = get_reranker(reranker_model)
+    if reranker is not None and ranked:
+        pool = ranked[:candidates]
+        scores = reranker.predict([(query, d.page_content) for d in pool])
+        ranked = [d for _, d in sorted(zip(scores, pool), key=lambda x: float(x[0]), reverse=True)]
+        timings["rerank_ms"] = round((time.perf_counter() - t3) * 1000, 2)
+    timings["total_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    return ranked[:k], timings
+
+def build_context(docs, max_chars: int=None, per_doc_chars: int=900) -> str:
+    max_chars = settings.RETRIEVAL_CONTEXT_CHARS if max_chars is None else max_chars
+    parts, used = [], 0
+    for i, d in enumerate(docs):
+        label = f"[{i+1}] "
+        sep = 2 if parts else 0
+        room = max_chars - used - sep
+        if room <= len(label):
+            break
+        part = (label + d.page_content[:per_doc_chars])[:room]
+        parts.append(part)
+        used += sep + len(part)
+    return "\n\n".join(parts)
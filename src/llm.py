@@ -1,8 +1,48 @@
+import threading
+from typing import Callable, Dict
 from config import settings
-from langchain_groq import ChatGroq
-from langchain_ollama import ChatOllama
+from langchain_core.rate_limiters import InMemoryRateLimiter
 
-def get_llm(provider: str):
+# extra providers (e.g. the benchmark fake model); factory(rate_limiter) -> chat model
+_PROVIDERS: Dict[str, Callable] = {}
+_RATE_LIMITERS: Dict[str, InMemoryRateLimiter] = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+# one client per (provider, rate_limited); clients are thread-safe and reuse their HTTP pool
+_CLIENTS: Dict[tuple, object] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+def get_rate_limiter(provider: str):
+    rps = settings.OLLAMA_REQUESTS_PER_SECOND if provider == "ollama" else settings.GROQ_REQUESTS_PER_SECOND
+    if rps <= 0:
+        return None
+    # one limiter per provider so every client/graph in the process shares the same budget
+    with _RATE_LIMITERS_LOCK:
+        limiter = _RATE_LIMITERS.get(provider)
+        if limiter is None:
+            limiter = _RATE_LIMITERS[provider] = InMemoryRateLimiter(requests_per_second=rps, max_bucket_size=max(1, int(rps)))
+        return limiter
+
+def register_provider(name: str, factory: Callable):
+    with _CLIENTS_LOCK:
+        _PROVIDERS[name] = factory
+        for key in [k for k in _CLIENTS if k[0] == name]:
+            del _CLIENTS[key]
+
+def get_llm(provider: str, rate_limited: bool=False):
+    key = (provider, rate_limited)
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = _CLIENTS[key] = _new_llm(provider, rate_limited)
+        return client
+
+def _new_llm(provider: str, rate_limited: bool):
+    rate_limiter = get_rate_limiter(provider) if rate_limited else None
+    if provider in _PROVIDERS:
+        return _PROVIDERS[provider](rate_limiter)
+    # provider SDKs are imported on first use; they dominate start-up time otherwise
     if provider == "ollama":
-        return ChatOllama(model=settings.OLLAMA_MODEL, temperature=0.2)
-    return ChatGroq(api_key=settings.GROQ_API_KEY, model=settings.GROQ_MODEL, temperature=0.2)
+        from langchain_ollama import ChatOllama
+        return ChatOllama(model=settings.OLLAMA_MODEL, temperature=0.2, rate_limiter=rate_limiter)
+    from langchain_groq import ChatGroq
+    return ChatGroq(api_key=settings.GROQ_API_KEY, model=settings.GROQ_MODEL, temperature=0.2, rate_limiter=rate_limiter)
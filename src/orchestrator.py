@@ -1,10 +1,23 @@
-from typing import TypedDict, Dict, Any
-from langgraph.graph import StateGraph, END
+import operator
+import asyncio
+from functools import partial
+from typing import Annotated, TypedDict, Dict, Any, List
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import StateGraph, START, END
 
+from config import settings
 from src.llm import get_llm
-from src.kb import load_kb, retrieve_medical_docs
+from src.kb import load_kb, load_bm25, hybrid_search, build_context, get_embeddings, kb_version
+from src.cache import get_response_cache
 from src.tools import detect_intent, analyze_sentiment, craft_final_response
+from src.tools import adetect_intent, aanalyze_sentiment, acraft_final_response
+from src.tools import classify_message, aclassify_message, fast_route
+from src.db import find_doctors, find_patient_names
 from src.agents import appointment_agent, records_agent, history_agent
+from src.agents import aappointment_agent, arecords_agent, ahistory_agent
+from src.adb import run_read
+from src.context import assemble_context
+from src.tracing import traced_node, atraced_node, instrument_llm, incr, new_run_id
 
 class HCState(TypedDict, total=False):
     user_message: str
@@ -13,30 +26,93 @@ class HCState(TypedDict, total=False):
     embedding_model: str
     intent: Dict[str, Any]
     sentiment: Dict[str, Any]
+    classifier: str
     action: Dict[str, Any]
     retrieved_context: str
+    retrieval_timings: Dict[str, float]
+    cache_key: Dict[str, Any]
+    cached_response: str
+    prompt_sections: Dict[str, str]
+    context_stats: Dict[str, Any]
     final_response: str
+    run_id: str
+    trace: Annotated[List[Dict[str, Any]], operator.add]
+
+def initial_state(user_message: str, db_path: str, faiss_dir: str, embedding_model: str) -> HCState:
+    return {"user_message": user_message, "db_path": db_path, "faiss_dir": faiss_dir, "embedding_model": embedding_model,
+            "run_id": new_run_id(), "trace": []}
+
+def _fast_intent(state: HCState):
+    # deterministic router first; None means "not sure", so the LLM decides
+    if not settings.FAST_ROUTER_ENABLED:
+        return None
+    db_path = state["db_path"]
+    try:
+        return fast_route(state["user_message"], doctors=find_doctors(db_path),
+                          patient_lookup=lambda names: find_patient_names(db_path, names))
+    except Exception:
+        return None
 
 def node_intent(state: HCState, llm):
-    return {"intent": detect_intent(llm, state["user_message"])}
+    return {"intent": _fast_intent(state) or detect_intent(llm, state["user_message"])}
 
 def node_sentiment(state: HCState, llm):
     return {"sentiment": analyze_sentiment(llm, state["user_message"])}
 
-def node_action(state: HCState):
+async def anode_intent(state: HCState, llm):
+    return {"intent": await run_read(_fast_intent, state) or await adetect_intent(llm, state["user_message"])}
+
+async def anode_sentiment(state: HCState, llm):
+    return {"sentiment": await aanalyze_sentiment(llm, state["user_message"])}
+
+def node_classify(state: HCState, llm):
+    routed = _fast_intent(state)
+    if routed:
+        return {"intent": routed, "sentiment": analyze_sentiment(llm, state["user_message"]), "classifier": "rules"}
+    out = classify_message(llm, state["user_message"])
+    if out.get("classifier") == "split_fallback":
+        incr("retries")
+    return out
+
+async def anode_classify(state: HCState, llm):
+    routed = await run_read(_fast_intent, state)
+    if routed:
+        return {"intent": routed, "sentiment": await aanalyze_sentiment(llm, state["user_message"]), "classifier": "rules"}
+    out = await aclassify_message(llm, state["user_message"])
+    if out.get("classifier") == "split_fallback":
+        incr("retries")
+    return out
+
+def _action_request(state: HCState):
     intent = state.get("intent", {})
     extracted = intent.get("extracted", {}) if isinstance(intent, dict) else {}
     label = intent.get("intent", "general") if isinstance(intent, dict) else "general"
+    return label, extracted
 
+def _static_action(label: str, extracted: Dict[str, Any]) -> Dict[str, Any]:
+    if label == "medical_info":
+        return {"ok": True, "action": "medical_info", "topic": extracted.get("symptoms/topic") or extracted.get("topic") or "medical question"}
+    return {"ok": True, "action": "general"}
+
+def node_action(state: HCState):
+    label, extracted = _action_request(state)
     if label == "book_appointment":
         return {"action": appointment_agent(state["db_path"], extracted)}
     if label == "update_records":
         return {"action": records_agent(state["db_path"], extracted, state["user_message"])}
     if label == "retrieve_history":
-        return {"action": history_agent(state["db_path"], extracted)}
-    if label == "medical_info":
-        return {"action": {"ok": True, "action": "medical_info", "topic": extracted.get("symptoms/topic") or extracted.get("topic") or "medical question"}}
-    return {"action": {"ok": True, "action": "general"}}
+        return {"action": history_agent(state["db_path"], extracted, state["user_message"])}
+    return {"action": _static_action(label, extracted)}
+
+async def anode_action(state: HCState):
+    label, extracted = _action_request(state)
+    if label == "book_appointment":
+        return {"action": await aappointment_agent(state["db_path"], extracted)}
+    if label == "update_records":
+        return {"action": await arecords_agent(state["db_path"], extracted, state["user_message"])}
+    if label == "retrieve_history":
+        return {"action": await ahistory_agent(state["db_path"], extracted, state["user_message"])}
+    return {"action": _static_action(label, extracted)}
 
 def node_retrieve(state: HCState):
     intent = state.get("intent", {})
@@ -47,38 +123,148 @@ def node_retrieve(state: HCState):
     topic = extracted.get("symptoms/topic") or extracted.get("topic") or state["user_message"]
     try:
         db = load_kb(state["faiss_dir"], state["embedding_model"])
-        docs = retrieve_medical_docs(db, topic, k=4)
-        ctx = "\n\n".join([f"[{i+1}] {d.page_content[:900]}" for i, d in enumerate(docs)])
-        return {"retrieved_context": ctx or "(no relevant context found)"}
     except Exception:
         return {"retrieved_context": "(knowledge base not built yet — click Build/Refresh Knowledge Base)"}
+    out = {}
+    if settings.RESPONSE_CACHE_ENABLED:
+        # the cache is an optimization: if it fails, answer from the KB without it
+        try:
+            query_vec = get_embeddings(state["embedding_model"]).embed_query(state["user_message"])
+            version = kb_version(state["faiss_dir"])
+            cached = get_response_cache(state["db_path"]).lookup(query_vec, version)
+            if cached is not None:
+                incr("cache_hits")
+                return {"retrieved_context": "(served from response cache)", "cached_response": cached}
+            out["cache_key"] = {"embedding": query_vec, "kb_version": version}
+        except Exception:
+            pass
+    try:
+        docs, timings = hybrid_search(db, load_bm25(state["faiss_dir"], state["embedding_model"]), topic, k=4)
+        ctx = build_context(docs, max_chars=settings.RETRIEVAL_CONTEXT_CHARS)
+        out["retrieved_context"] = ctx or "(no relevant context found)"
+        out["retrieval_timings"] = timings
+        return out
+    except Exception:
+        return {"retrieved_context": "(knowledge base search failed)"}
+
+async def anode_retrieve(state: HCState):
+    # FAISS/BM25 loading and search are blocking; keep them off the event loop
+    return await asyncio.to_thread(node_retrieve, state)
+
+def _cache_response(state: HCState, response: str):
+    # only medical_info answers are cached; patient-specific intents never reach here with a cache_key
+    intent = state.get("intent", {})
+    label = intent.get("intent", "general") if isinstance(intent, dict) else "general"
+    key = state.get("cache_key")
+    if label != "medical_info" or not key or not response:
+        return
+    try:
+        get_response_cache(state["db_path"]).store(state["user_message"], key["embedding"], response, key["kb_version"])
+    except Exception:
+        pass
+
+def node_assemble(state: HCState, provider: str):
+    if state.get("cached_response"):
+        return {}
+    out = assemble_context(state["user_message"], state.get("intent", {}), state.get("sentiment", {}),
+                           state.get("action", {}), state.get("retrieved_context", ""), provider=provider)
+    return {"prompt_sections": out["sections"], "context_stats": out["stats"]}
+
+async def anode_assemble(state: HCState, provider: str):
+    return node_assemble(state, provider)
+
+def _prompt_sections(state: HCState) -> Dict[str, Any]:
+    sections = state.get("prompt_sections")
+    if sections:
+        return sections
+    return {"intent": state.get("intent", {}), "sentiment": state.get("sentiment", {}),
+            "action": state.get("action", {}), "context": state.get("retrieved_context", "")}
 
 def node_respond(state: HCState, llm):
-    return {"final_response": craft_final_response(
-        llm,
-        message=state["user_message"],
-        intent=state.get("intent", {}),
-        sentiment=state.get("sentiment", {}),
-        action=state.get("action", {}),
-        context=state.get("retrieved_context","")
-    )}
-
-def build_graph(provider: str):
-    llm = get_llm(provider)
+    if state.get("cached_response"):
+        return {"final_response": state["cached_response"]}
+    response = craft_final_response(llm, message=state["user_message"], **_prompt_sections(state))
+    _cache_response(state, response)
+    return {"final_response": response}
+
+async def anode_respond(state: HCState, llm):
+    if state.get("cached_response"):
+        return {"final_response": state["cached_response"]}
+    response = await acraft_final_response(llm, message=state["user_message"], **_prompt_sections(state))
+    await asyncio.to_thread(_cache_response, state, response)
+    return {"final_response": response}
+
+def _node(name: str, func, afunc):
+    return RunnableLambda(traced_node(name, func), afunc=atraced_node(name, afunc), name=name)
+
+def _llm_node(name: str, func, afunc, llm):
+    return _node(name, partial(func, llm=llm), partial(afunc, llm=llm))
+
+def build_graph(provider: str, parallel: bool=True, classifier: str="split", rate_limited: bool=False):
+    llm = instrument_llm(get_llm(provider, rate_limited=rate_limited))
     g = StateGraph(HCState)
-    g.add_node("intent", lambda s: node_intent(s, llm))
-    g.add_node("sentiment", lambda s: node_sentiment(s, llm))
-    g.add_node("action", node_action)
-    g.add_node("retrieve", node_retrieve)
-    g.add_node("respond", lambda s: node_respond(s, llm))
-    g.set_entry_point("intent")
-    g.add_edge("intent", "sentiment")
-    g.add_edge("sentiment", "action")
-    g.add_edge("action", "retrieve")
-    g.add_edge("retrieve", "respond")
+    g.add_node("action", _node("action", node_action, anode_action))
+    g.add_node("retrieve", _node("retrieve", node_retrieve, anode_retrieve))
+    g.add_node("assemble", _node("assemble", partial(node_assemble, provider=provider), partial(anode_assemble, provider=provider)))
+    g.add_node("respond", _llm_node("respond", node_respond, anode_respond, llm))
+    g.add_edge("assemble", "respond")
+    if classifier == "fused":
+        # one LLM call yields intent + sentiment; falls back to two calls on bad JSON
+        g.add_node("classify", _llm_node("classify", node_classify, anode_classify, llm))
+        g.add_edge(START, "classify")
+        if parallel:
+            g.add_edge("classify", "action")
+            g.add_edge("classify", "retrieve")
+            g.add_edge(["action", "retrieve"], "assemble")
+        else:
+            g.add_edge("classify", "action")
+            g.add_edge("action", "retrieve")
+            g.add_edge("retrieve", "assemble")
+        g.add_edge("respond", END)
+        return g.compile()
+    g.add_node("intent", _llm_node("intent", node_intent, anode_intent, llm))
+    g.add_node("sentiment", _llm_node("sentiment", node_sentiment, anode_sentiment, llm))
+    if parallel:
+        # intent and sentiment are independent; action/retrieve only need the intent
+        g.add_edge(START, "intent")
+        g.add_edge(START, "sentiment")
+        g.add_edge("intent", "action")
+        g.add_edge("intent", "retrieve")
+        g.add_edge(["sentiment", "action", "retrieve"], "assemble")
+    else:
+        g.set_entry_point("intent")
+        g.add_edge("intent", "sentiment")
+        g.add_edge("sentiment", "action")
+        g.add_edge("action", "retrieve")
+        g.add_edge("retrieve", "assemble")
     g.add_edge("respond", END)
     return g.compile()
 
 def run_graph(graph, user_message: str, db_path: str, faiss_dir: str, embedding_model: str):
-    state: HCState = {"user_message": user_message, "db_path": db_path, "faiss_dir": faiss_dir, "embedding_model": embedding_model}
+    state = initial_state(user_message, db_path, faiss_dir, embedding_model)
     return graph.invoke(state)
+
+async def arun_graph(graph, user_message: str, db_path: str, faiss_dir: str, embedding_model: str):
+    state = initial_state(user_message, db_path, faiss_dir, embedding_model)
+    return await graph.ainvoke(state)
+
+def _stream_event(mode: str, data):
+    # "updates" -> one event per finished node; "messages" -> LLM tokens, kept only for the respond node
+    if mode == "updates":
+        return [{"type": "node", "node": node, "update": update or {}} for node, update in data.items()]
+    chunk, meta = data
+    text = getattr(chunk, "content", "")
+    if meta.get("langgraph_node") == "respond" and isinstance(text, str) and text:
+        return [{"type": "token", "content": text}]
+    return []
+
+def stream_graph(graph, user_message: str, db_path: str, faiss_dir: str, embedding_model: str):
+    state = initial_state(user_message, db_path, faiss_dir, embedding_model)
+    for mode, data in graph.stream(state, stream_mode=["updates", "messages"]):
+        yield from _stream_event(mode, data)
+
+async def astream_graph(graph, user_message: str, db_path: str, faiss_dir: str, embedding_model: str):
+    state = initial_state(user_message, db_path, faiss_dir, embedding_model)
+    async for mode, data in graph.astream(state, stream_mode=["updates", "messages"]):
+        for event in _stream_event(mode, data):
+            yield event
@@ -1,5 +1,9 @@
+import asyncio
 import json
-from typing import Dict, Any
+import re
+import threading
+import time
+from typing import Dict, Any, AsyncIterator, Callable, Iterator, List, Optional, Tuple
 from datetime import datetime, timedelta
 from langchain_core.prompts import ChatPromptTemplate
 
@@ -21,6 +25,21 @@ SENTIMENT_PROMPT = ChatPromptTemplate.from_messages([
     ("human", "{message}")
 ])
 
+CLASSIFY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "You are a healthcare task router and sentiment analyzer. In ONE pass:\n"
+     "- Classify the user's intent into ONE of: book_appointment, update_records, retrieve_history, medical_info, general.\n"
+     "- Extract entities: patient_name, doctor, specialty, date_hint, time_hint, symptoms/topic.\n"
+     "- Analyze the sentiment of the message.\n"
+     "Return STRICT JSON with exactly two keys:\n"
+     "intent (object with intent, confidence (0-1), extracted (object with the entities above)),\n"
+     "sentiment (object with sentiment (positive|neutral|negative), intensity (0-1), emotions (list), notes (short))."),
+    ("human", "{message}")
+])
+
+INTENT_LABELS = ("book_appointment", "update_records", "retrieve_history", "medical_info", "general")
+SENTIMENT_LABELS = ("positive", "neutral", "negative")
+
 RESPONSE_PROMPT = ChatPromptTemplate.from_messages([
     ("system",
      "You are an Agentic Healthcare Assistant.\n"
@@ -42,6 +61,32 @@ def _safe_json(text: str) -> Dict[str, Any]:
     except Exception:
         return {"raw": text}
 
+def _strip_fences(text: str) -> str:
+    t = text.strip()
+    if t.startswith("```"):
+        t = t.strip("`")
+        if t.lower().startswith("json"):
+            t = t[4:]
+    return t.strip()
+
+def _validate_classification(obj: Any) -> Optional[Dict[str, Any]]:
+    if not isinstance(obj, dict):
+        return None
+    intent, sentiment = obj.get("intent"), obj.get("sentiment")
+    if not isinstance(intent, dict) or intent.get("intent") not in INTENT_LABELS:
+        return None
+    if not isinstance(sentiment, dict) or sentiment.get("sentiment") not in SENTIMENT_LABELS:
+        return None
+    if not isinstance(intent.get("extracted"), dict):
+        intent["extracted"] = {}
+    return {"intent": intent, "sentiment": sentiment}
+
+def _parse_classification(text: str) -> Optional[Dict[str, Any]]:
+    try:
+        return _validate_classification(json.loads(_strip_fences(text)))
+    except Exception:
+        return None
+
 def detect_intent(llm, message: str) -> Dict[str, Any]:
     resp = llm.invoke(INTENT_PROMPT.format_messages(message=message))
     return _safe_json(resp.content if hasattr(resp, "content") else str(resp))
@@ -50,15 +95,78 @@ def analyze_sentiment(llm, message: str) -> Dict[str, Any]:
     resp = llm.invoke(SENTIMENT_PROMPT.format_messages(message=message))
     return _safe_json(resp.content if hasattr(resp, "content") else str(resp))
 
-def craft_final_response(llm, message: str, intent: Dict[str, Any], sentiment: Dict[str, Any], action: Dict[str, Any], context: str) -> str:
-    resp = llm.invoke(RESPONSE_PROMPT.format_messages(
+def classify_message(llm, message: str) -> Dict[str, Any]:
+    resp = llm.invoke(CLASSIFY_PROMPT.format_messages(message=message))
+    parsed = _parse_classification(resp.content if hasattr(resp, "content") else str(resp))
+    if parsed is None:
+        return {"intent": detect_intent(llm, message), "sentiment": analyze_sentiment(llm, message), "classifier": "split_fallback"}
+    parsed["classifier"] = "fused"
+    return parsed
+
+async def adetect_intent(llm, message: str) -> Dict[str, Any]:
+    resp = await llm.ainvoke(INTENT_PROMPT.format_messages(message=message))
+    return _safe_json(resp.content if hasattr(resp, "content") else str(resp))
+
+async def aanalyze_sentiment(llm, message: str) -> Dict[str, Any]:
+    resp = await llm.ainvoke(SENTIMENT_PROMPT.format_messages(message=message))
+    return _safe_json(resp.content if hasattr(resp, "content") else str(resp))
+
+def compact_json(obj: Any) -> str:
+    """Minified JSON with None/empty fields dropped; what the response prompt embeds."""
+    def prune(v):
+        if isinstance(v, dict):
+            return {k: prune(x) for k, x in v.items() if x not in (None, "", [], {})}
+        if isinstance(v, (list, tuple)):
+            return [prune(x) for x in v]
+        return v
+    return json.dumps(prune(obj), separators=(",", ":"), ensure_ascii=False, default=str)
+
+def _prompt_text(value: Any) -> str:
+    # sections arrive pre-serialized from src.context; plain dicts are compacted here
+    return value if isinstance(value, str) else compact_json(value)
+
+def _response_messages(message: str, intent: Dict[str, Any], sentiment: Dict[str, Any], action: Dict[str, Any], context: str):
+    return RESPONSE_PROMPT.format_messages(
         message=message,
-        intent=json.dumps(intent, indent=2),
-        sentiment=json.dumps(sentiment, indent=2),
-        action=json.dumps(action, indent=2),
+        intent=_prompt_text(intent),
+        sentiment=_prompt_text(sentiment),
+        action=_prompt_text(action),
         context=context
-    ))
-    return resp.content if hasattr(resp, "content") else str(resp)
+    )
+
+def _chunk_text(chunk) -> str:
+    content = chunk.content if hasattr(chunk, "content") else chunk
+    if isinstance(content, list):
+        return "".join(c.get("text", "") if isinstance(c, dict) else str(c) for c in content)
+    return str(content)
+
+def stream_final_response(llm, message: str, intent: Dict[str, Any], sentiment: Dict[str, Any], action: Dict[str, Any], context: str) -> Iterator[str]:
+    for chunk in llm.stream(_response_messages(message, intent, sentiment, action, context)):
+        text = _chunk_text(chunk)
+        if text:
+            yield text
+
+def craft_final_response(llm, message: str, intent: Dict[str, Any], sentiment: Dict[str, Any], action: Dict[str, Any], context: str) -> str:
+    # built on stream() so graph.stream(stream_mode="messages") sees tokens as they arrive
+    return "".join(stream_final_response(llm, message, intent, sentiment, action, context))
+
+async def aclassify_message(llm, message: str) -> Dict[str, Any]:
+    resp = await llm.ainvoke(CLASSIFY_PROMPT.format_messages(message=message))
+    parsed = _parse_classification(resp.content if hasattr(resp, "content") else str(resp))
+    if parsed is None:
+        intent, sentiment = await asyncio.gather(adetect_intent(llm, message), aanalyze_sentiment(llm, message))
+        return {"intent": intent, "sentiment": sentiment, "classifier": "split_fallback"}
+    parsed["classifier"] = "fused"
+    return parsed
+
+async def astream_final_response(llm, message: str, intent: Dict[str, Any], sentiment: Dict[str, Any], action: Dict[str, Any], context: str) -> AsyncIterator[str]:
+    async for chunk in llm.astream(_response_messages(message, intent, sentiment, action, context)):
+        text = _chunk_text(chunk)
+        if text:
+            yield text
+
+async def acraft_final_response(llm, message: str, intent: Dict[str, Any], sentiment: Dict[str, Any], action: Dict[str, Any], context: str) -> str:
+    return "".join([t async for t in astream_final_response(llm, message, intent, sentiment, action, context)])
 
 def parse_date_hint(date_hint: str) -> str:
     base = datetime.utcnow().date()
@@ -92,3 +200,183 @@ def pick_time_window(time_hint: str):
     if "evening" in th:
         return (17, 20)
     return (9, 17)
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose; good enough for budgeting prompt sections
+    return (len(text or "") + 3) // 4
+
+# --- extractive summaries -------------------------------------------------------
+# Long records (imported PDF reports) are summarized without an LLM: sentences are
+# scored by the document frequency of their content words and the best ones kept
+# in original order.
+
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|\n{1,}")
+_WORD_RE = re.compile(r"[a-z][a-z0-9\-]+")
+_SUMMARY_STOPWORDS = {"the", "and", "for", "with", "that", "this", "was", "were", "are", "has", "have", "had", "been", "from",
+                      "not", "but", "its", "per", "may", "can", "will", "should", "into", "than", "then", "also", "any"}
+
+def summarize_text(text: str, max_chars: int=400) -> str:
+    text = re.sub(r"[ \t]+", " ", text or "").strip()
+    if len(text) <= max_chars:
+        return text
+    sentences = list(dict.fromkeys(s.strip() for s in _SENTENCE_SPLIT_RE.split(text) if len(s.strip()) > 3))
+    freq: Dict[str, int] = {}
+    for s in sentences:
+        for w in set(_WORD_RE.findall(s.lower())):
+            if w not in _SUMMARY_STOPWORDS:
+                freq[w] = freq.get(w, 0) + 1
+
+    def score(s: str) -> float:
+        words = [w for w in _WORD_RE.findall(s.lower()) if w not in _SUMMARY_STOPWORDS]
+        return sum(freq.get(w, 0) for w in set(words)) / (1 + len(words)) ** 0.5
+
+    # the first sentence usually names the report/diagnosis; always keep it
+    ranked = [0] + sorted(range(1, len(sentences)), key=lambda i: score(sentences[i]), reverse=True)
+    keep, used = [], 0
+    for i in ranked:
+        cost = len(sentences[i]) + 1
+        if used + cost > max_chars:
+            continue
+        keep.append(i)
+        used += cost
+    if not keep:
+        return sentences[0][:max_chars - 3].rstrip() + "..."
+    return " ".join(sentences[i] for i in sorted(keep))
+
+# --- rule-based fast path -------------------------------------------------------
+# Deterministic pre-classifier for unambiguous messages. It only answers when exactly
+# one intent pattern fires and the entities that intent needs are present; anything
+# else returns None and the caller falls back to the LLM router.
+
+_INTENT_RULES = [
+    ("retrieve_history", re.compile(r"\b(medical history|history (?:of|for)|past (?:records|visits)|previous (?:records|visits)|show (?:me )?(?:the )?(?:medical )?records)\b", re.I)),
+    ("update_records", re.compile(r"\b(add|update|append|log)\b[^.?!]*\b(record|note|notes)\b|\brecord for patient\b", re.I)),
+    ("book_appointment", re.compile(r"\b(book|schedule|reserve|make|set up)\b[^.?!]*\b(appointment|consultation|visit|slot)\b|\bappointment with\b", re.I)),
+    ("medical_info", re.compile(r"\b(what (?:are|is) (?:the )?(?:symptoms|signs|causes|treatment|treatments|side effects)|symptoms? of|treatment (?:for|options)|side effects? of|causes? of|how (?:to|do you) (?:treat|manage|prevent))\b", re.I)),
+]
+_PATIENT_RE = re.compile(r"\b(?:for|of)\s+(?:patient\s+)?([A-Z][a-zA-Z'\-]+(?: [A-Z][a-zA-Z'\-]+)?)|\bpatient\s+([A-Z][a-zA-Z'\-]+(?: [A-Z][a-zA-Z'\-]+)?)")
+_DOCTOR_RE = re.compile(r"\bDr\.?\s+([A-Z][a-zA-Z'\-]+)")
+_DATE_RE = re.compile(r"\b(today|tomorrow|(?:next\s+|this\s+)?(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday)|\d{4}-\d{2}-\d{2})\b", re.I)
+_TIME_RE = re.compile(r"\b(morning|afternoon|evening)\b", re.I)
+_CAPITALIZED_RE = re.compile(r"\b([A-Z][a-zA-Z\-]+(?: [A-Z][a-zA-Z\-]+)*)")
+_TOPIC_PREFIX_RE = re.compile(r"^\s*(what (?:are|is)( the)?|tell me about|explain)\s+", re.I)
+_NOT_NAMES = {"Show", "Book", "Add", "Update", "What", "Please", "Dr", "Patient", "Record", "Schedule", "The", "I", "My",
+              "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday", "Today", "Tomorrow"}
+
+FAST_ROUTE_STATS = {"calls": 0, "hits": 0, "fallbacks": 0, "total_ms": 0.0}
+_FAST_ROUTE_LOCK = threading.Lock()
+
+def _match_specialty(message: str, doctors: List[Dict[str, Any]]) -> Optional[str]:
+    low = message.lower()
+    for spec in sorted({d["specialty"] for d in doctors if d.get("specialty")}, key=len, reverse=True):
+        s = spec.lower()
+        # "cardiologist" / "dermatologist" also match their specialty by stem
+        if s in low or (" " not in s and len(s) >= 8 and s[:6] in low):
+            return spec
+    return None
+
+def _match_doctor(message: str, doctors: List[Dict[str, Any]]) -> Optional[str]:
+    m = _DOCTOR_RE.search(message)
+    if not m:
+        return None
+    surname = m.group(1).lower()
+    for d in doctors:
+        if surname in d["name"].lower():
+            return d["name"]
+    return None
+
+def _name_words(phrase: str) -> List[str]:
+    # "Anjali Rao Monday" -> ["Anjali", "Rao"]; stops at the first non-name word
+    words = []
+    for w in phrase.split():
+        if w in _NOT_NAMES:
+            break
+        words.append(w)
+    return words
+
+def _name_candidates(message: str) -> List[str]:
+    # full names ("Anjali Rao") first, then single words, so the longest known name wins
+    out = []
+    for run in _CAPITALIZED_RE.findall(message):
+        for part in re.split(r"\b(?:%s)\b" % "|".join(_NOT_NAMES), run):
+            words = part.split()
+            for n in range(len(words), 0, -1):
+                out.extend(" ".join(words[i:i + n]) for i in range(len(words) - n + 1))
+    return list(dict.fromkeys(out))
+
+def _explicit_candidates(message: str) -> List[str]:
+    # "for Anjali Rao Monday" -> ["Anjali Rao"], "of Ramesh's diabetes" -> ["Ramesh"]; only trailing
+    # keyword/weekday words are trimmed, never a surname, so "Anjali Sharma" can't become "Anjali"
+    out = []
+    for m in _PATIENT_RE.finditer(message):
+        name = re.sub(r"'s?$", "", " ".join(_name_words(m.group(1) or m.group(2))))
+        if name:
+            out.append(name)
+    return list(dict.fromkeys(out))
+
+def _match_patient(message: str, doctor: Optional[str], patient_lookup: Callable[[List[str]], List[str]]) -> Tuple[Optional[str], bool]:
+    """Returns (patient, mentions_known_patient).
+
+    The patient must be a known patient named in full; an unverified guess would write records
+    to a phantom (or a different) patient. mentions_known_patient is True when any known patient
+    name appears anywhere in the message, so callers can refuse to fast-route it.
+    """
+    if patient_lookup is None:
+        return None, False
+    not_doctor = lambda c: not (doctor and c.lower() in doctor.lower())
+    explicit = [c for c in _explicit_candidates(message) if not_doctor(c)]
+    candidates = [c for c in _name_candidates(message) if not_doctor(c)]
+    names = list(dict.fromkeys(explicit + candidates))
+    known = set(patient_lookup(names)) if names else set()
+    mentioned = any(c in known for c in names)
+    if explicit:
+        return next((c for c in explicit if c in known), None), mentioned
+    return next((c for c in candidates if c in known), None), mentioned
+
+def _route(message: str, doctors: List[Dict[str, Any]], patient_lookup) -> Optional[Dict[str, Any]]:
+    matched = [label for label, rx in _INTENT_RULES if rx.search(message)]
+    if len(matched) != 1:
+        return None
+    label = matched[0]
+    doctor = _match_doctor(message, doctors)
+    patient, mentions_patient = _match_patient(message, doctor, patient_lookup)
+    extracted: Dict[str, Any] = {}
+    if label in ("retrieve_history", "update_records"):
+        if not patient:
+            return None
+        extracted["patient_name"] = patient
+    elif label == "book_appointment":
+        if not patient:
+            return None
+        date_m, time_m = _DATE_RE.search(message), _TIME_RE.search(message)
+        extracted.update({
+            "patient_name": patient,
+            "doctor": doctor,
+            "specialty": _match_specialty(message, doctors),
+            "date_hint": date_m.group(1) if date_m else None,
+            "time_hint": time_m.group(1) if time_m else None,
+        })
+        extracted["date"] = parse_date_hint(extracted["date_hint"])
+        extracted["time_window"] = list(pick_time_window(extracted["time_hint"]))
+    elif label == "medical_info":
+        if patient or mentions_patient:
+            return None  # "what are Ramesh's symptoms" is a patient question, not general info
+        extracted["symptoms/topic"] = _TOPIC_PREFIX_RE.sub("", message).strip(" ?.!")
+    return {"intent": label, "confidence": 0.95, "extracted": extracted, "router": "rules"}
+
+def fast_route(message: str, doctors: List[Dict[str, Any]]=None, patient_lookup: Callable[[List[str]], List[str]]=None) -> Optional[Dict[str, Any]]:
+    t0 = time.perf_counter()
+    result = _route(message or "", doctors or [], patient_lookup)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    with _FAST_ROUTE_LOCK:
+        FAST_ROUTE_STATS["calls"] += 1
+        FAST_ROUTE_STATS["hits" if result else "fallbacks"] += 1
+        FAST_ROUTE_STATS["total_ms"] += elapsed_ms
+    return result
+
+def fast_route_stats() -> Dict[str, float]:
+    with _FAST_ROUTE_LOCK:
+        out = dict(FAST_ROUTE_STATS)
+    out["hit_rate"] = round(out["hits"] / out["calls"], 4) if out["calls"] else 0.0
+    out["avg_ms"] = round(out["total_ms"] / out["calls"], 4) if out["calls"] else 0.0
+    return out
@@ -0,0 +1,326 @@
+import atexit
+import contextvars
+import functools
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config import settings
+
+TRACE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spans (
+  span_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  run_id TEXT,
+  kind TEXT,
+  name TEXT,
+  parent TEXT,
+  started_at REAL,
+  wall_ms REAL,
+  prompt_tokens INTEGER,
+  completion_tokens INTEGER,
+  llm_calls INTEGER,
+  retries INTEGER,
+  cache_hits INTEGER,
+  db_calls INTEGER,
+  db_ms REAL,
+  error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_spans_kind_name_started ON spans(kind, name, started_at);
+"""
+
+SPAN_COLUMNS = ("run_id", "kind", "name", "parent", "started_at", "wall_ms", "prompt_tokens", "completion_tokens",
+                "llm_calls", "retries", "cache_hits", "db_calls", "db_ms", "error")
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+FLUSH_EVERY = 50
+FLUSH_SECONDS = 2.0
+
+_current_span: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("hc_current_span", default=None)
+# nesting depth of traced_db calls; only the outermost one is rolled up into the node span
+_db_depth: contextvars.ContextVar[int] = contextvars.ContextVar("hc_db_depth", default=0)
+
+def trace_path(db_path: str) -> str:
+    return str(Path(db_path).with_name("traces.db"))
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex
+
+def _new_span(run_id: Optional[str], kind: str, name: str, parent: Optional[str]=None) -> Dict[str, Any]:
+    return {"run_id": run_id, "kind": kind, "name": name, "parent": parent, "started_at": time.time(), "wall_ms": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0, "llm_calls": 0, "retries": 0, "cache_hits": 0,
+            "db_calls": 0, "db_ms": 0.0, "error": None}
+
+def incr(counter: str, n: int=1):
+    """Bump a counter (cache_hits, retries, ...) on the node span currently executing, if any."""
+    span = _current_span.get()
+    if span is not None:
+        span[counter] = span.get(counter, 0) + n
+
+class TraceStore:
+    """Buffered span sink: SQLite table for the dashboard, optional Prometheus text file for scraping."""
+
+    def __init__(self, path: str, prometheus_file: str=""):
+        self.path = path
+        self.prometheus_file = prometheus_file
+        self._lock = threading.Lock()
+        self._buffer: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        self._hist: Dict[tuple, List[float]] = {}
+        self._totals: Dict[tuple, Dict[str, float]] = {}
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(TRACE_SCHEMA)
+
+    def record(self, span: Dict[str, Any]):
+        key = (span["kind"], span["name"])
+        with self._lock:
+            self._buffer.append(span)
+            buckets = self._hist.setdefault(key, [0] * (len(LATENCY_BUCKETS_MS) + 1))
+            for i, le in enumerate(LATENCY_BUCKETS_MS):
+                if span["wall_ms"] <= le:
+                    buckets[i] += 1
+            buckets[-1] += 1
+            tot = self._totals.setdefault(key, {"count": 0, "wall_ms": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+                                                "retries": 0, "cache_hits": 0, "errors": 0})
+            tot["count"] += 1
+            tot["wall_ms"] += span["wall_ms"]
+            for c in ("prompt_tokens", "completion_tokens", "retries", "cache_hits"):
+                tot[c] += span.get(c) or 0
+            tot["errors"] += 1 if span.get("error") else 0
+            due = len(self._buffer) >= FLUSH_EVERY or time.monotonic() - self._last_flush >= FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            if rows:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    f"INSERT INTO spans({', '.join(SPAN_COLUMNS)}) VALUES ({', '.join('?' * len(SPAN_COLUMNS))})",
+                    [tuple(r.get(c) for c in SPAN_COLUMNS) for r in rows]
+                )
+                self._conn.execute("COMMIT")
+            text = self.prometheus_text() if self.prometheus_file and rows else None
+        if text is not None:
+            out = Path(self.prometheus_file)
+            out.parent.mkdir(parents=True, exist_ok=True)
+            tmp = out.with_suffix(out.suffix + ".tmp")
+            tmp.write_text(text, encoding="utf-8")
+            tmp.replace(out)
+
+    def prometheus_text(self) -> str:
+        # called with the lock held; metrics cover spans seen by this process
+        lines = ["# HELP hc_span_latency_ms Wall time per graph node / db call in milliseconds.",
+                 "# TYPE hc_span_latency_ms histogram"]
+        for (kind, name), buckets in sorted(self._hist.items()):
+            labels = f'kind="{kind}",name="{name}"'
+            for le, n in zip(LATENCY_BUCKETS_MS, buckets):
+                lines.append(f'hc_span_latency_ms_bucket{{{labels},le="{le}"}} {n}')
+            lines.append(f'hc_span_latency_ms_bucket{{{labels},le="+Inf"}} {buckets[-1]}')
+            lines.append(f"hc_span_latency_ms_sum{{{labels}}} {self._totals[(kind, name)]['wall_ms']:.3f}")
+            lines.append(f"hc_span_latency_ms_count{{{labels}}} {buckets[-1]}")
+        for metric in ("prompt_tokens", "completion_tokens", "retries", "cache_hits", "errors"):
+            lines.append(f"# TYPE hc_span_{metric}_total counter")
+            for (kind, name), tot in sorted(self._totals.items()):
+                lines.append(f'hc_span_{metric}_total{{kind="{kind}",name="{name}"}} {tot[metric]}')
+        return "\n".join(lines) + "\n"
+
+    def percentiles(self, kind: str="node", since: float=None) -> List[Dict[str, Any]]:
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, wall_ms, prompt_tokens, completion_tokens, retries, cache_hits, error FROM spans "
+                "WHERE kind=? AND started_at>=? ORDER BY name, wall_ms", (kind, since or 0.0)
+            ).fetchall()
+        by_name: Dict[str, List[tuple]] = {}
+        for r in rows:
+            by_name.setdefault(r[0], []).append(r)
+        out = []
+        for name, rs in by_name.items():
+            walls = [r[1] for r in rs]
+            out.append({
+                "name": name,
+                "count": len(rs),
+                "p50_ms": round(_percentile(walls, 0.50), 1),
+                "p95_ms": round(_percentile(walls, 0.95), 1),
+                "max_ms": round(walls[-1], 1),
+                "prompt_tokens": sum(r[2] or 0 for r in rs),
+                "completion_tokens": sum(r[3] or 0 for r in rs),
+                "retries": sum(r[4] or 0 for r in rs),
+                "cache_hits": sum(r[5] or 0 for r in rs),
+                "errors": sum(1 for r in rs if r[6]),
+            })
+        return sorted(out, key=lambda x: x["p95_ms"], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._buffer.clear()
+            self._hist.clear()
+            self._totals.clear()
+            self._conn.execute("DELETE FROM spans")
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+_STORES: Dict[str, TraceStore] = {}
+_STORES_LOCK = threading.Lock()
+
+def get_trace_store(db_path: str) -> TraceStore:
+    path = trace_path(db_path)
+    with _STORES_LOCK:
+        store = _STORES.get(path)
+        if store is None:
+            prom = settings.TRACE_PROMETHEUS_FILE if settings.TRACE_EXPORT in ("prometheus", "both") else ""
+            store = _STORES[path] = TraceStore(path, prometheus_file=prom)
+        return store
+
+def flush_all():
+    with _STORES_LOCK:
+        stores = list(_STORES.values())
+    for store in stores:
+        try:
+            store.flush()
+        except Exception:
+            pass
+
+atexit.register(flush_all)
+
+def _finish(span: Dict[str, Any], t0: float, db_path: Optional[str]):
+    span["wall_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+    if db_path:
+        try:
+            get_trace_store(db_path).record(span)
+        except Exception:
+            pass
+
+def _attach(update, span: Dict[str, Any]):
+    if isinstance(update, dict):
+        update = dict(update)
+        update["trace"] = [{k: span[k] for k in SPAN_COLUMNS if k not in ("run_id", "kind", "parent")}]
+    return update
+
+def traced_node(name: str, func: Callable) -> Callable:
+    """Wrap a sync graph node: time it, collect LLM/db/cache counters, add its span to state["trace"]."""
+    if not settings.TRACING_ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(state, *args, **kwargs):
+        span = _new_span(state.get("run_id"), "node", name)
+        token = _current_span.set(span)
+        t0 = time.perf_counter()
+        try:
+            update = func(state, *args, **kwargs)
+        except Exception as e:
+            span["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            _finish(span, t0, state.get("db_path"))
+        return _attach(update, span)
+    return wrapper
+
+def atraced_node(name: str, afunc: Callable) -> Callable:
+    if not settings.TRACING_ENABLED:
+        return afunc
+
+    @functools.wraps(afunc)
+    async def wrapper(state, *args, **kwargs):
+        span = _new_span(state.get("run_id"), "node", name)
+        token = _current_span.set(span)
+        t0 = time.perf_counter()
+        try:
+            update = await afunc(state, *args, **kwargs)
+        except Exception as e:
+            span["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            _finish(span, t0, state.get("db_path"))
+        return _attach(update, span)
+    return wrapper
+
+def traced_db(func: Callable) -> Callable:
+    """Time a db.py call (first argument is db_path) and roll it up into the enclosing node span."""
+    if not settings.TRACING_ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(db_path, *args, **kwargs):
+        parent = _current_span.get()
+        span = _new_span(parent["run_id"] if parent else None, "db", func.__name__, parent["name"] if parent else None)
+        depth = _db_depth.get()
+        token = _db_depth.set(depth + 1)
+        t0 = time.perf_counter()
+        try:
+            return func(db_path, *args, **kwargs)
+        except Exception as e:
+            span["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            elapsed = (time.perf_counter() - t0) * 1000
+            _db_depth.reset(token)
+            # e.g. reserve_slot -> find_free_slots: the inner call is already inside the outer one's time
+            if parent is not None and depth == 0:
+                parent["db_calls"] += 1
+                parent["db_ms"] = round(parent["db_ms"] + elapsed, 3)
+            _finish(span, t0, db_path)
+    return wrapper
+
+def _usage_from_result(response) -> tuple:
+    prompt = completion = 0
+    for gens in getattr(response, "generations", None) or []:
+        for gen in gens:
+            usage = getattr(getattr(gen, "message", None), "usage_metadata", None)
+            if usage:
+                prompt += usage.get("input_tokens", 0) or 0
+                completion += usage.get("output_tokens", 0) or 0
+    if not (prompt or completion):
+        token_usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+        prompt = token_usage.get("prompt_tokens", 0) or 0
+        completion = token_usage.get("completion_tokens", 0) or 0
+    return prompt, completion
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """Adds provider-reported token usage and retries to the node span active when the LLM runs."""
+
+    run_inline = True
+
+    def on_llm_end(self, response, **kwargs):
+        span = _current_span.get()
+        if span is None:
+            return
+        prompt, completion = _usage_from_result(response)
+        span["llm_calls"] += 1
+        span["prompt_tokens"] += prompt
+        span["completion_tokens"] += completion
+
+    def on_retry(self, retry_state, **kwargs):
+        incr("retries")
+
+TOKEN_USAGE_HANDLER = TokenUsageHandler()
+
+def instrument_llm(llm):
+    if settings.TRACING_ENABLED:
+        callbacks = list(getattr(llm, "callbacks", None) or [])
+        if TOKEN_USAGE_HANDLER not in callbacks:
+            llm.callbacks = callbacks + [TOKEN_USAGE_HANDLER]
+    return llm
+
+def node_percentiles(db_path: str, since: float=None) -> List[Dict[str, Any]]:
+    return get_trace_store(db_path).percentiles("node", since)
+
+def db_percentiles(db_path: str, since: float=None) -> List[Dict[str, Any]]:
+    return get_trace_store(db_path).percentiles("db", since)